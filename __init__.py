@@ -22,6 +22,7 @@ else:
     from .vi_node import vinode_categories, envinode_categories
     from .envi_mat import envi_materials, envi_constructions
     from .vi_func import iprop, bprop, eprop, fprop, sprop, fvprop, sunpath1
+    from . import livi_store, livi_sched
     from .vi_operators import *
     from .vi_ui import *
 
@@ -102,14 +103,15 @@ def eupdate(self, context):
     for frame in range(context.scene.frame_start, context.scene.frame_end + 1):
         for o in [obj for obj in bpy.data.objects if obj.lires == 1]:
             if str(frame) in o['omax'].keys():
+                oreslist = livi_store.read(o, 'oreslist', frame)
                 maxo, mino = max(o['omax'].values()), min(o['omin'].values())
                 if len(o['cverts']) == 0:
-                    for i, fli in enumerate([(face, face.loop_indices) for face in o.data.polygons if face.select == True]):
+                    for i, fli in enumerate([(o.data.polygons[cf], o.data.polygons[cf].loop_indices) if cf >= 0 else (None, []) for cf in o['cfaces']]):
                         for li in fli[1]:
                             vi = o.data.loops[li].vertex_index
-                            o.data.shape_keys.key_blocks[str(frame)].data[vi].co = o.data.shape_keys.key_blocks['Basis'].data[vi].co + context.scene.vi_disp_3dlevel * (abs(inv - (o['oreslist'][str(frame)][i]-mino)/(maxo - mino)) * fli[0].normal)
+                            o.data.shape_keys.key_blocks[str(frame)].data[vi].co = o.data.shape_keys.key_blocks['Basis'].data[vi].co + context.scene.vi_disp_3dlevel * (abs(inv - (oreslist[i]-mino)/(maxo - mino)) * fli[0].normal)
                 for vn, v in enumerate(o['cverts']):
-                    o.data.shape_keys.key_blocks[str(frame)].data[v].co = o.data.shape_keys.key_blocks['Basis'].data[v].co + context.scene.vi_disp_3dlevel * (abs(inv - (o['oreslist'][str(frame)][vn]-mino)/(maxo - mino)) * o.data.vertices[v].normal)
+                    o.data.shape_keys.key_blocks[str(frame)].data[v].co = o.data.shape_keys.key_blocks['Basis'].data[v].co + context.scene.vi_disp_3dlevel * (abs(inv - (oreslist[vn]-mino)/(maxo - mino)) * o.data.vertices[v].normal)
                 o.data.update()
 
 def register():
@@ -509,6 +511,7 @@ def register():
     nodeitems_utils.register_node_categories("EnVi Nodes", envinode_categories)
 
 def unregister():
+    livi_sched.closesessions()
     bpy.utils.unregister_module(__name__)
     nodeitems_utils.unregister_node_categories("Vi Nodes")
     nodeitems_utils.unregister_node_categories("EnVi Nodes")
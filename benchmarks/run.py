@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# Headless benchmarks of the VI-Suite calculation and results paths. Blender modules are replaced by
+# the stand-ins in standin.py and Radiance/EnergyPlus by the replay scripts in fakebin, so timings
+# cover the addon's own Python overhead at sensor and zone counts that are impractical in a GUI session.
+#
+# radgexport and enpolymatexport are not timed. Their cost is in Blender itself: scene updates, the OBJ
+# export operator and walks over bpy.data materials, EnVi construction properties and zone geometry, none
+# of which a stand-in reproduces, so a timing would measure the stand-in. li_calc is timed in its
+# generative mode, which runs the rtrace jobs and result parsing and returns before resapply sets vertex
+# colours through Blender.
+#
+# python benchmarks/run.py --sensors 1000 100000 1000000 --zones 1 50 --out results.json
+
+import os, time, json, argparse, tempfile, random, shutil, tracemalloc, types
+import standin
+
+benchdir = os.path.dirname(os.path.abspath(__file__))
+bpy = standin.install()
+os.environ['PATH'] = os.path.join(benchdir, 'fakebin') + os.pathsep + os.environ['PATH']
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+memory = 0
+
+def timed(name, func, *args, **kwargs):
+    # Timings are taken untraced as tracemalloc slows allocation heavy code; peak memory comes from a second, traced run
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    secs, peak = time.perf_counter() - start, 0
+    if memory:
+        tracemalloc.start()
+        func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print('{:<40} {:>10.3f} s {:>10.1f} MB'.format(name, secs, peak/1e6))
+    return({'name': name, 'seconds': secs, 'peak_mb': peak/1e6})
+
+def checktypes(livi_sched, tmpdir):
+    # Results end up in Blender ID properties, which only take Python numbers, so the values parsed from
+    # text and from binary rtrace output have to be floats
+    for fmt in ('a', 'f')[:1 + np]:
+        vals = livi_sched.resvals(livi_sched.runjob('rtrace -fa{} probe.oct < probe.pts'.format(fmt), tmpdir)[0], fmt == 'f')
+        if not len(vals) or not all([isinstance(val, float) for val in vals]) or not isinstance(max(vals), float):
+            raise TypeError('rtrace -fa{} results parsed as {}'.format(fmt, type(vals[0]).__name__ if len(vals) else 'nothing'))
+    print('Result types checked')
+
+def mtxtext(hours, patches = 146):
+    # gendaymtx style text: patches blocks of hourly RGB values separated by blank lines
+    rows = ['{0} {0} {0}\n'.format(round(random.random() * 100, 3)) for h in range(hours)]
+    return([line for p in range(patches) for line in rows + ['\n']])
+
+def esofile(path, zones, hours = 8760):
+    zvars = ('Zone Air Temperature [C] !Hourly', 'Zone Air System Sensible Heating Rate [W] !Hourly', 'Zone Air System Sensible Cooling Rate [W] !Hourly')
+    header = ['Program Version,EnergyPlus\n', '2,8,Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],Hour[],StartMinute[],EndMinute[],DayType\n',
+              '7,1,Environment,Site Outdoor Air Drybulb Temperature [C] !Hourly\n']
+    zids = {}
+    for z in range(zones):
+        for v, zvar in enumerate(zvars):
+            zids[(z, v)] = 8 + z * len(zvars) + v
+            header.append('{},1,ZONE{},{}\n'.format(zids[(z, v)], z, zvar))
+    with open(path, 'w') as eso:
+        eso.writelines(header + ['End of Data Dictionary\n'])
+        for h in range(hours):
+            eso.write('2,{},{},{},0,{},0.00,60.00,Monday\n7,{:.2f}\n'.format(h//24 + 1, (h//720) % 12 + 1, (h//24) % 28 + 1, h % 24 + 1, 10 + h % 10))
+            eso.write(''.join(['{},{:.2f}\n'.format(zids[key], 20 + (h + key[0]) % 5) for key in zids]))
+        eso.write('End of Data\n')
+
+def esonode(resfilename, zones):
+    bpy.data.objects[:] = [types.SimpleNamespace(name = 'Zone{}'.format(z), envi_type = '1', layers = [0, 1]) for z in range(zones)]
+    return(standin.StandinNode(resfilename = resfilename, resname = 'results', dsdoy = 0, dedoy = 0))
+
+class Elements:
+    # Mesh element collection supporting foreach_get from flat numpy arrays
+    def __init__(self, **attrs):
+        self.attrs = attrs
+    def __len__(self):
+        return(len(next(iter(self.attrs.values()))))
+    def foreach_get(self, attr, target):
+        target[:] = self.attrs[attr].ravel()
+    def foreach_set(self, attr, source):
+        self.attrs[attr][:] = source
+
+class Layers(list):
+    # Vertex colour layers of a mesh with nloops loops
+    def __init__(self, nloops):
+        self.nloops, self.active = nloops, None
+    def new(self, name = 'Col'):
+        self.append(types.SimpleNamespace(name = name, data = Elements(color = numpy.ones(self.nloops * 3, dtype = numpy.float32))))
+        return(self[-1])
+
+def gridmesh(side):
+    # side x side grid of quads with one sensing material
+    vco = numpy.array([(x, y, 0) for y in range(side + 1) for x in range(side + 1)], dtype = float)
+    corners = numpy.array([(y * (side + 1) + x, y * (side + 1) + x + 1, (y + 1) * (side + 1) + x + 1, (y + 1) * (side + 1) + x) for y in range(side) for x in range(side)])
+    polys = Elements(material_index = numpy.zeros(side * side, dtype = int), center = vco[corners].mean(axis = 1), normal = numpy.tile((0., 0., 1.), (side * side, 1)),
+                     loop_start = numpy.arange(0, side * side * 4, 4), loop_total = numpy.full(side * side, 4))
+    return(types.SimpleNamespace(polygons = polys, loops = Elements(vertex_index = corners.ravel()), materials = [types.SimpleNamespace(livi_sense = 1)],
+                                 vertices = Elements(co = vco, normal = numpy.tile((0., 0., 1.), (len(vco), 1))), vertex_colors = Layers(corners.size)))
+
+def licalcnodes(tmpdir, ptsfile, sensors, frames, jobs):
+    # Geometry, context and simulation node stand-ins for a LiVi Basic li_calc pass over frames 0 .. frames - 1
+    scene = bpy.context.scene
+    scene.fs, scene.fe, scene.objects, scene.active_layer = 0, frames - 1, [], 0
+    geonode = standin.StandinNode(newdir = tmpdir, filebase = os.path.join(tmpdir, 'bench'), nproc = str(jobs), rm = 'rm', cat = 'cat ', cpoint = '0')
+    geonode['reslen'], geonode['radfiles'] = sensors, ['']
+    shutil.copyfile(ptsfile, geonode.filebase + '.rtrace')
+    connode = standin.StandinNode(bl_label = 'LiVi Basic', analysismenu = '0', animmenu = 'Static', dcmode = False)
+    connode['simalg'], connode['resname'], connode['skynum'] = '', 'illumout', 0
+    simnode = standin.StandinNode(ambcache = False)
+    simnode['radparams'] = ''
+    return(simnode, connode, geonode)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'VI-Suite headless benchmarks')
+    parser.add_argument('--sensors', type = int, nargs = '+', default = [1000, 10000])
+    parser.add_argument('--zones', type = int, nargs = '+', default = [1, 10])
+    parser.add_argument('--hours', type = int, default = 8760)
+    parser.add_argument('--skies', type = int, nargs = '+', default = [1, 4], help = 'CBDM sky subdivisions, 1 for Tregenza or a Reinhart MF')
+    parser.add_argument('--jobs', type = int, default = 4)
+    parser.add_argument('--memory', action = 'store_true', help = 'Also record peak Python memory use')
+    parser.add_argument('--out', default = '')
+    args = parser.parse_args()
+    global memory
+    memory = args.memory
+
+    vi_func, livi_sched, envi_calc, livi_export, livi_calc = standin.load('vi_func'), standin.load('livi_sched'), standin.load('envi_calc'), standin.load('livi_export'), standin.load('livi_calc')
+    tmpdir = tempfile.mkdtemp(prefix = 'vibench')
+    results = []
+    op = types.SimpleNamespace(report = lambda rtype, msg: None)
+
+    try:
+        doys = [d for d in range(1, 366) for h in range(24)][:args.hours]
+        lsts = [h + 0.5 for d in range(1, 366) for h in range(24)][:args.hours]
+        results.append(timed('solarPosition x{}'.format(len(doys)), lambda: [vi_func.solarPosition(d, l, 52, 0) for d, l in zip(doys, lsts)]))
+        if np == 1:
+            results.append(timed('solarPositions x{}'.format(len(doys)), vi_func.solarPositions, numpy.array(doys), numpy.array(lsts), 52, 0))
+
+        mtxlines = mtxtext(args.hours)
+        results.append(timed('mtx2vals {} h'.format(args.hours), vi_func.mtx2vals, mtxlines, 0))
+        vecvals = vi_func.mtx2vals(mtxlines, 0)[0]
+
+        # Repeated small evaluations, e.g. probes of target values, with a new rtrace each time and through one session
+        probes = [(p * 0.01, 0, 0.75, 0, 0, 1) for p in range(10)]
+        with open(os.path.join(tmpdir, 'probe.pts'), 'w') as pts:
+            pts.write(''.join(['{} {} {} {} {} {}\n'.format(*probe) for probe in probes]))
+        open(os.path.join(tmpdir, 'probe.oct'), 'w').close()
+        checktypes(livi_sched, tmpdir)
+        results.append(timed('rtrace 100 x10 point probes', lambda: [livi_sched.resvals(livi_sched.runjob('rtrace -faa probe.oct < probe.pts', tmpdir)[0], 0) for p in range(100)]))
+        results.append(timed('rtrace session 100 x10 point probes', lambda: [livi_sched.rtsession('bench', 'probe.oct', '', '', 1, tmpdir).trace(probes) for p in range(100)]))
+        livi_sched.closesessions()
+
+        for sensors in args.sensors:
+            ptsfile = os.path.join(tmpdir, 'pts{}'.format(sensors))
+            with open(ptsfile, 'w') as pts:
+                pts.write(''.join(['{0} {0} 0.75 0 0 1\n'.format(s * 0.01) for s in range(sensors)]))
+            for fmt in ('a', 'f')[:1 + np]:
+                cmds = ['rtrace -fa{} octree < {}'.format(fmt, ptsfile)] * args.jobs
+                results.append(timed('rtrace {} x{} sensors -fa{}'.format(args.jobs, sensors, fmt),
+                                     lambda: [livi_sched.resvals(out[0], fmt == 'f') for out in livi_sched.runjobs(cmds, args.jobs)]))
+
+            # One frame with the sensor points split between processes and stitched back in order
+            chunkfiles = livi_sched.splitpoints(ptsfile, args.jobs)
+            cmds = ['rtrace -faa octree < {}'.format(chunkfile) for chunkfile in chunkfiles]
+            results.append(timed('rtrace 1 x{} sensors in {} chunks'.format(sensors, len(cmds)),
+                                 lambda: livi_sched.resvals(livi_sched.joinjobs(livi_sched.runjobs(cmds, args.jobs), len(cmds))[0][0], 0)))
+
+            # A full li_calc frame loop; generative mode returns the results instead of applying them in Blender
+            for frames in (1, 24):
+                simnode, connode, geonode = licalcnodes(tmpdir, ptsfile, sensors, frames, args.jobs)
+                results.append(timed('li_calc {} sensors {} frames'.format(sensors, frames), livi_calc.li_calc, op, simnode, connode, geonode, 0, genframe = frames, genframes = list(range(frames))))
+
+            if np == 1:
+                mesh = gridmesh(int(sensors**0.5))
+                for cpoint in ('0', '1'):
+                    results.append(timed('calcpoints {} sensors cpoint {}'.format(sensors, cpoint), livi_export.calcpoints, mesh, numpy.identity(4), cpoint))
+                    geo = standin.StandinNode(data = mesh)
+                    geo['cverts'] = livi_export.calcpoints(mesh, numpy.identity(4), '1')[3]
+                    vals, lut = numpy.random.random(len(geo['cverts']) if cpoint == '1' else len(mesh.polygons)) * 100, livi_calc.collut()
+                    def colour():
+                        lsens, nsens = livi_calc.loopsensors(geo, cpoint)
+                        livi_calc.loopcolours(mesh, 'res', lsens, livi_calc.rescolours(vals, 0, 100, lut))
+                    results.append(timed('result colours {} sensors cpoint {}'.format(sensors, cpoint), colour))
+                livi_cbdm = standin.load('livi_cbdm')
+                for mf in args.skies:
+                    # Finer skies use random sky matrices of the same shape as gendaymtx -m mf would give
+                    skyvals = vecvals if mf == 1 else numpy.column_stack((vecvals[:,:2], numpy.random.random((len(vecvals), vi_func.skypatches(mf))) * 100)).astype(numpy.float32)
+                    skyhours, skywd, sky = livi_cbdm.skymatrix(skyvals)
+                    sens = numpy.random.random((sensors, sky.shape[1])).astype(numpy.float32)
+                    results.append(timed('cbdm da {} sensors {} patches'.format(sensors, sky.shape[1]), livi_cbdm.da, sens, sky, 300))
+                    results.append(timed('cbdm udi {} sensors {} patches'.format(sensors, sky.shape[1]), livi_cbdm.udi, sens, sky, 100, 300, 3000))
+
+        for zones in args.zones:
+            resfilename = os.path.join(tmpdir, 'results{}.eso'.format(zones))
+            esofile(resfilename, zones, args.hours)
+            results.append(timed('processf {} zones'.format(zones), vi_func.processf, op, esonode(resfilename, zones)))
+            simdir = os.path.join(tmpdir, 'sim{}'.format(zones))
+            os.makedirs(simdir)
+            os.environ['VIBENCH_ESO'] = resfilename
+            connode = types.SimpleNamespace(newdir = simdir, sdoy = 1, edoy = 365)
+            node = esonode(os.path.join(simdir, 'results.eso'), zones)
+            def simulate():
+                esimrun, esimq = envi_calc.envi_start(node, connode)
+                esimrun.wait()
+                envi_calc.envi_finish(op, node, connode)
+            results.append(timed('EnergyPlus run and results {} zones'.format(zones), simulate))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if args.out:
+        with open(args.out, 'w') as outfile:
+            json.dump({'numpy': np, 'results': results}, outfile, indent = 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import sys, os, types, importlib
+
+# Minimal stand-ins for the Blender modules so that the VI-Suite modules can be imported and their
+# non-interactive code paths run outside Blender.
+
+class StandinModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return(standin)
+
+def standin(*args, **kwargs):
+    return(None)
+
+class Vector(list):
+    def __init__(self, vals = (0, 0, 0)):
+        list.__init__(self, vals)
+
+class StandinNode(dict):
+    '''Dictionary with attribute access standing in for a node or ID block with ID properties'''
+    def __init__(self, **kwargs):
+        dict.__init__(self)
+        self.__dict__.update(kwargs)
+
+class Texts(list):
+    def load(self, filepath):
+        self.append(types.SimpleNamespace(name = os.path.basename(filepath)))
+
+def install():
+    bpy = StandinModule('bpy')
+    bpy.props, bpy.types, bpy.ops, bpy.app = StandinModule('bpy.props'), StandinModule('bpy.types'), StandinModule('bpy.ops'), StandinModule('bpy.app')
+    bpy.data = types.SimpleNamespace(objects = [], meshes = [], materials = [], texts = Texts(), node_groups = {})
+    bpy.context = types.SimpleNamespace(scene = types.SimpleNamespace(), active_object = None)
+    mathutils = StandinModule('mathutils')
+    mathutils.Vector = Vector
+    modules = {'bpy': bpy, 'bpy.props': bpy.props, 'bpy.types': bpy.types, 'bpy.ops': bpy.ops, 'bpy.app': bpy.app, 'mathutils': mathutils}
+    for name in ('bmesh', 'bgl', 'blf', 'bpy_extras', 'bpy_extras.io_utils', 'nodeitems_utils', 'mathutils.bvhtree'):
+        modules[name] = StandinModule(name)
+    sys.modules.update(modules)
+    return(bpy)
+
+def load(modname):
+    # Import an addon module as part of a 'visuite' package without running the addon registration in __init__
+    if 'visuite' not in sys.modules:
+        package = types.ModuleType('visuite')
+        package.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        sys.modules['visuite'] = package
+    return(importlib.import_module('visuite.' + modname))
@@ -1,19 +1,56 @@
-import os, bpy
-from subprocess import PIPE, Popen
+import os, bpy, threading, queue
+from subprocess import PIPE, Popen, STDOUT
 from os import rename
 from .vi_func import processf
+from . import livi_sched, envi_eso
 
 def envi_sim(calc_op, node, connode):
     os.chdir(connode.newdir)
-    esimcmd = "EnergyPlus in.idf in.epw" 
+    esimcmd = "EnergyPlus in.idf in.epw"
     esimrun = Popen(esimcmd, shell = True, stdout = PIPE)
     for line in esimrun.stdout:
         if 'FATAL' in line.decode():
-            print(line) 
-    for fname in os.listdir('.'):
+            print(line)
+    envi_finish(calc_op, node, connode)
+
+def envi_start(node, connode):
+    # Start EnergyPlus without blocking. Output lines are collected on a reader thread. It runs without a
+    # shell in its own process group so that envi_stop can end it and anything it starts.
+    esimrun = Popen(["EnergyPlus", "in.idf", "in.epw"], stdout = PIPE, stderr = STDOUT, cwd = connode.newdir, **livi_sched.groupargs())
+    esimq = queue.Queue()
+    threading.Thread(target = envi_read, args = (esimrun.stdout, esimq), daemon = True).start()
+    return(esimrun, esimq)
+
+def envi_stop(esimrun):
+    # End a running EnergyPlus with its whole process tree, which also closes the pipe the reader waits on
+    livi_sched.stoptree(esimrun)
+
+def envi_read(stream, esimq):
+    for line in stream:
+        esimq.put(line.decode())
+
+def envi_lines(esimq):
+    lines = []
+    while not esimq.empty():
+        lines.append(esimq.get_nowait())
+    return(lines)
+
+def envi_errlines(connode, pos):
+    # New complete lines of eplusout.err since byte position pos
+    errfile = os.path.join(connode.newdir, 'eplusout.err')
+    if os.path.isfile(errfile):
+        with open(errfile, 'rb') as errf:
+            errf.seek(pos)
+            errtext = errf.read()
+            errtext = errtext[:errtext.rfind(b'\n') + 1]
+            return(errtext.decode(errors = 'replace').splitlines(), pos + len(errtext))
+    return([], pos)
+
+def envi_finish(calc_op, node, connode):
+    for fname in os.listdir(connode.newdir):
         if fname.split(".")[0] == node.resname:
             os.remove(os.path.join(connode.newdir, fname))
-    for fname in os.listdir('.'):
+    for fname in os.listdir(connode.newdir):
         if fname.split(".")[0] == "eplusout":
             rename(os.path.join(connode.newdir, fname), os.path.join(connode.newdir,fname.replace("eplusout", node.resname)))
 
@@ -22,9 +59,21 @@ def envi_sim(calc_op, node, connode):
     node.dedoy = connode.edoy
     if node.resname+".err" not in [im.name for im in bpy.data.texts]:
         bpy.data.texts.load(os.path.join(connode.newdir, node.resname+".err"))
-    calc_op.report({'INFO'}, "Calculation is finished.")  
-            
-    if node.resname+".err" not in [im.name for im in bpy.data.texts]:
-        bpy.data.texts.load(os.path.join(connode.newdir, node.resname+".err"))
+    calc_op.report({'INFO'}, "Calculation is finished.")
 
-   
\ No newline at end of file
+def envi_batch(variants, nproc, resname):
+    # Run exported IDF variants, each in its own directory, on a pool bounded by the processor count
+    # and store each variant's ESO in a results store. variants is a list of (key, directory) pairs.
+    workers = livi_sched.framejobs(nproc, len(variants))[0]
+    livi_sched.runjobs(["EnergyPlus in.idf in.epw"] * len(variants), workers, 'EnergyPlus', cwds = [vdir for key, vdir in variants])
+    stores = {}
+    for key, vdir in variants:
+        for fname in [fname for fname in os.listdir(vdir) if fname.split(".")[0] == "eplusout"]:
+            os.replace(os.path.join(vdir, fname), os.path.join(vdir, fname.replace("eplusout", resname)))
+        resfilename = os.path.join(vdir, resname+".eso")
+        if os.path.isfile(resfilename) and envi_eso.np:
+            series, headers, dos, dosrange = envi_eso.esoseries(resfilename)
+            stores[key] = envi_eso.writestore(resfilename, series, headers, dosrange)
+        elif os.path.isfile(resfilename):
+            stores[key] = resfilename
+    return(stores)
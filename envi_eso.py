@@ -0,0 +1,71 @@
+import os, json
+from array import array
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+# Columnar store for EnergyPlus ESO results: one .npy file per report variable or time column and
+# a JSON index of variable ids, names, zones and day of simulation ranges.
+
+def storedir(resfilename):
+    return(os.path.splitext(resfilename)[0] + '-eso')
+
+def writestore(resfilename, series, headers, dosrange):
+    sdir = storedir(resfilename)
+    if not os.path.isdir(sdir):
+        os.makedirs(sdir)
+    for fname in os.listdir(sdir):
+        os.remove(os.path.join(sdir, fname))
+    index = {}
+    for key in series:
+        numpy.save(os.path.join(sdir, '{}.npy'.format(key)), numpy.asarray(series[key], dtype = (float, int)[key in ('Month', 'Day', 'Hour')]))
+        index[key] = {'header': headers.get(key, [key]), 'length': len(series[key]), 'doy': dosrange}
+    with open(os.path.join(sdir, 'index.json'), 'w') as indexfile:
+        json.dump(index, indexfile)
+    return(sdir)
+
+def readindex(sdir):
+    with open(os.path.join(sdir, 'index.json'), 'r') as indexfile:
+        return(json.load(indexfile))
+
+def readseries(sdir, key):
+    return(numpy.load(os.path.join(sdir, '{}.npy'.format(key)), mmap_mode = 'r'))
+
+def resseries(node, key, offset):
+    # Values of a result series without its header, read from the store when there is one.
+    # offset is the header length of the series in the in-node resdict fallback.
+    if node.get('resstore') and os.path.isfile(os.path.join(node['resstore'], '{}.npy'.format(key))):
+        return(readseries(node['resstore'], key))
+    else:
+        return(node['resdict'][key][offset:])
+
+def esoseries(esofile, header = None):
+    # Report variables of an ESO file streamed into series keyed by variable id. header(linesplit) gives the
+    # header of a variable from its data dictionary line, or None to leave the variable out; by default all
+    # variables are kept with 'key, variable' headers. Time columns are taken from the day of simulation lines.
+    # Returns the series, headers, day of simulation id and day of simulation range.
+    header = header or (lambda linesplit: [linesplit[2], linesplit[3]])
+    series, headers, dos, data = {}, {}, '', 0
+    with open(esofile, 'r') as eso:
+        for line in eso:
+            linesplit = line.strip('\n').split(',')
+            if data and linesplit[0] in series:
+                series[linesplit[0]].append(float(linesplit[1]))
+                if linesplit[0] == dos:
+                    for col, key in ((2, 'Month'), (3, 'Day'), (5, 'Hour')):
+                        series[key].append(int(linesplit[col]))
+            elif not data and len(linesplit) > 3 and linesplit[2] == 'Day of Simulation[]':
+                dos = linesplit[0]
+                series[dos], series['Month'], series['Day'], series['Hour'] = array('d'), array('i'), array('i'), array('i')
+                headers[dos] = ['Day of Simulation']
+            elif not data and len(linesplit) > 3 and linesplit[1] == '1':
+                vheader = header(linesplit)
+                if vheader:
+                    series[linesplit[0]] = array('d')
+                    headers[linesplit[0]] = vheader
+            elif linesplit[0] == 'End of Data Dictionary':
+                data = 1
+    return(series, headers, dos, (series[dos][0], series[dos][-1]) if dos and series[dos] else (0, 0))
@@ -1,7 +1,8 @@
-import bpy, os, itertools, subprocess, datetime, sys, nodeitems_utils, mathutils
+import bpy, os, itertools, subprocess, datetime, sys, nodeitems_utils, mathutils, shutil
 from nodeitems_utils import  NodeItem
 from . import vi_func
 from . import vi_node
+from . import envi_idf
 dtdf = datetime.date.fromordinal
 #from subprocess import PIPE, Popen, STDOUT
 #from math import pi, sin, cos, acos, asin
@@ -14,7 +15,7 @@ def enpolymatexport(exp_op, node, locnode, em, ec):
     for scene in bpy.data.scenes:
         scene.update()
     en_epw = open(locnode.weather, "r")
-    en_idf = open(node.idf_file, 'w')
+    en_idf = envi_idf.IDFBuffer(node.idf_file)
     node.sdoy = datetime.datetime(datetime.datetime.now().year, locnode.startmonth, 1).timetuple().tm_yday
     node.edoy = (datetime.date(datetime.datetime.now().year, locnode.endmonth + (1, -11)[locnode.endmonth == 12], 1) - datetime.timedelta(days = 1)).timetuple().tm_yday
 
@@ -253,7 +254,7 @@ Construction,\n\
             "    1,                                                                !- Type\n" +
             "    1,                                                                !- Multiplier\n" +
             "    {0:{width}}!- Ceiling Height (m)\n".format("{:.3f}".format(vi_func.ceilheight(obj, [])) + ",", width = s - 4) +
-            "    {0:{width}}!- Volume (m3)\n".format("{:.2f}".format(vi_func.objvol('', obj)) + ",", width = s - 4) +
+            "    {0:{width}}!- Volume (m3)\n".format("{:.2f}".format(obj['volume'] if obj.get('volume') else vi_func.objvol('', obj)) + ",", width = s - 4) +
             "    autocalculate,                                                    !- Floor Area (m2)\n" +
             "    TARP,                                                             !- Zone Inside Convection Algorithm\n"+
             "    TARP,                                                             !- Zone Outside Convection Algorithm\n"+
@@ -267,12 +268,13 @@ Construction,\n\
 
     en_idf.write("!-   ===========  ALL OBJECTS IN CLASS: SURFACE DEFINITIONS ===========\n\n")
 
+    boundmatches = vi_func.boundmatch()
     for obj in [obj for obj in bpy.data.objects if obj.layers[1] and obj.type == 'MESH' and obj.envi_type != '0']:
         obm, odv = obj.matrix_world, obj.data.vertices
         obj["floorarea"] = sum([vi_func.triarea(obj, face) for face in obj.data.polygons if obj.data.materials[face.material_index].envi_con_type =='floor'])
         for poly in obj.data.polygons:
             mat = obj.data.materials[poly.material_index]
-            (obc, obco, se, we) = vi_func.boundpoly(obj, mat, poly)
+            (obc, obco, se, we) = vi_func.boundpoly(obj, mat, poly, boundmatches)
 
             if mat.envi_con_type in ('Wall', "Floor", "Roof") and mat.envi_con_makeup != "2":
                 en_idf.write('\nBuildingSurface:Detailed,\n' +
@@ -592,6 +594,21 @@ Construction,\n\
         subprocess.call(node.cp+locnode.weather.replace(' ', '\ ')+" "+os.path.join(node.newdir, "in.epw"), shell = True)
         subprocess.call(node.cp+scene.vipath.replace(' ', '\ ')+os.sep+"EPFiles"+os.sep+"Energy+.idd "+node.newdir+os.sep, shell = True)
 
+def envi_variants(exp_op, node, locnode, em, ec, variants):
+    # Export one IDF per variant into its own directory. variants is a list of (key, setup) pairs where
+    # setup puts the scene, material or location settings into the state for that variant.
+    vdirs = []
+    for key, setup in variants:
+        setup()
+        enpolymatexport(exp_op, node, locnode, em, ec)
+        vdir = os.path.join(node.newdir, 'variants', key)
+        if not os.path.isdir(vdir):
+            os.makedirs(vdir)
+        for fname in ('in.idf', 'in.epw', 'Energy+.idd'):
+            shutil.copyfile(os.path.join(node.newdir, fname), os.path.join(vdir, fname))
+        vdirs.append((key, vdir))
+    return(vdirs)
+
 def pregeo(op):
     scene = bpy.context.scene
     for obj in [obj for obj in scene.objects if obj.layers[1] == True]:
@@ -877,7 +894,7 @@ class infiltration(object):
             if obj.envi_infbasetype == "0":
                 self.baseinfil = obj.envi_infbaselevel * obj["floorarea"] * obj.envi_occsmax * 0.001
             else:
-                self.baseinfil = obj.envi_infbaselevel * vi_func.objvol(obj) * obj["floorarea"] * obj.envi_occsmax * 0.001
+                self.baseinfil = obj.envi_infbaselevel * obj['volume'] * obj["floorarea"] * obj.envi_occsmax * 0.001
         elif obj.envi_occinftype == "2" and obj.envi_occtype == "2":
             self.infilmax = ("", obj.envi_inflevel, "", "")
             self.infilcalc = "Flow/Area"
@@ -891,7 +908,7 @@ class infiltration(object):
             if obj.envi_infbasetype == "0":
                 self.baseinfil = (1/(obj.envi_infbaselevel/obj["floorarea"])) * 1/obj.envi_occsmax * 0.001
             else:
-                self.baseinfil = (1/(obj.envi_infbaselevel * vi_func.objvol(obj)/obj["floorarea"])) * (1/obj.envi_occsmax) * 0.001
+                self.baseinfil = (1/(obj.envi_infbaselevel * obj['volume']/obj["floorarea"])) * (1/obj.envi_occsmax) * 0.001
         elif obj.envi_occinftype == "2" and obj.envi_occtype == "3":
             self.infilmax = ("", obj.envi_inflevel, "", "")
             self.infilcalc = "Flow/Area"
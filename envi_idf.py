@@ -0,0 +1,96 @@
+import re
+
+# In-memory IDF model. Export routines write object text to the buffer as they would to a file; on
+# close the text is split into IDF objects, materials, constructions and schedules with identical
+# fields are merged under the first name used and the result is written in a single pass.
+
+dedupclasses = ('Material', 'Material:NoMass', 'Material:AirGap', 'WindowMaterial:Glazing', 'WindowMaterial:Gas', 'Construction', 'Schedule:Compact')
+
+# Positions of the fields that hold material, construction or schedule names in the classes the exporter
+# writes, counted from the object name at 0. Only these fields are renamed when objects are merged.
+refs = {'Construction': range(1, 11), 'BuildingSurface:Detailed': (2,), 'FenestrationSurface:Detailed': (2,), 'Shading:Building:Detailed': (1,),
+        'ThermostatSetpoint:DualSetpoint': (1, 2), 'ThermostatSetpoint:SingleHeating': (1,), 'ThermostatSetpoint:SingleCooling': (1,),
+        'ZoneControl:Thermostat': (2,), 'ZoneHVAC:IdealLoadsAirSystem': (1, 14, 15), 'People': (2, 9), 'ZoneInfiltration:DesignFlowRate': (2,),
+        'AirflowNetwork:MultiZone:Zone': (2, 8), 'AirflowNetwork:MultiZone:Surface': (5, 9), 'Fan:ZoneExhaust': (1,)}
+
+class IDFBuffer(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.texts = []
+
+    def write(self, text):
+        self.texts.append(text)
+
+    def objects(self):
+        # Split the buffered text into (class name, field values, text) objects. Comment only and blank
+        # lines between objects are kept as objects with no class.
+        objs, lines = [], []
+        for line in ''.join(self.texts).splitlines(True):
+            code = line.split('!')[0].strip()
+            if lines or code:
+                lines.append(line)
+                if code.endswith(';'):
+                    codes = [l.split('!')[0].strip() for l in lines]
+                    fields = [field.strip() for field in ' '.join([c for c in codes if c]).rstrip(';').split(',')]
+                    # Class names written on their own line without a trailing comma
+                    if codes[0] and ',' not in codes[0] and len(lines) > 1:
+                        fields = [codes[0]] + [field.strip() for field in ' '.join([c for c in codes[1:] if c]).rstrip(';').split(',')]
+                    objs.append((fields[0], fields[1:], ''.join(lines)))
+                    lines = []
+            else:
+                objs.append(('', [], line))
+        if lines:
+            objs.append(('', [], ''.join(lines)))
+        return(objs)
+
+    def close(self):
+        objs, aliases, keys = self.objects(), {}, {}
+        # Aliases are found in file order so that constructions see the merged names of their layers
+        for oclass, fields, text in objs:
+            if oclass in dedupclasses and fields:
+                key = (oclass, tuple(refnames(oclass, fields, aliases)[1:]))
+                if key in keys and keys[key] != fields[0]:
+                    aliases[fields[0]] = keys[key]
+                else:
+                    keys.setdefault(key, fields[0])
+
+        written = set()
+        idftexts, drop = [], 0
+        for oclass, fields, text in objs:
+            # Blank lines following a left out object go with it
+            drop = dropped(oclass, fields, aliases, written) or (drop and not text.strip())
+            if not drop:
+                idftexts.append(realias(oclass, text, aliases))
+        with open(self.filename, 'w') as idffile:
+            idffile.write(''.join(idftexts))
+
+def dropped(oclass, fields, aliases, written):
+    # Merged objects and repeats of an object already written are left out
+    if oclass in dedupclasses and fields:
+        if fields[0] in aliases or (oclass, tuple(fields)) in written:
+            return(1)
+        written.add((oclass, tuple(fields)))
+    return(0)
+
+def refnames(oclass, fields, aliases):
+    return([aliases.get(field, field) if f in refs.get(oclass, ()) else field for f, field in enumerate(fields)])
+
+def realias(oclass, text, aliases):
+    # Rename merged objects in the reference fields of an object's text, keeping its layout and comments.
+    # f counts fields from the object name at 0, with the class name at -1.
+    if not aliases or oclass not in refs:
+        return(text)
+    lines, f = [], -1
+    for line in text.splitlines(True):
+        code, sep, comment = line.partition('!')
+        parts = re.split(r'([,;])', code)
+        for p, part in enumerate(parts):
+            if part in (',', ';'):
+                f += 1
+            elif f in refs[oclass] and part.strip() in aliases:
+                parts[p] = part.replace(part.strip(), aliases[part.strip()], 1)
+        lines.append(''.join(parts) + sep + comment)
+        # Class names written on their own line without a trailing comma
+        if f == -1 and code.strip():
+            f = 0
+    return(''.join(lines))
@@ -101,7 +101,7 @@ class envi_materials(object):
     {1:{width}}! - Resistance\n\n".format(name + ",", stringmat, width = s-4))
     
     def tmat_write(self, idf_file, name, stringmat, thickness):
-        idf_file.write("WindowMaterial:{2[0]}\n\
+        idf_file.write("WindowMaterial:{2[0]},\n\
     {0:{width}}! - Name\n\
     {2[1]:{width}}! - Optical Data Type\n\
     {2[2]:{width}}! - Window Glass Spectral Data Set Name\n\
@@ -118,7 +118,7 @@ class envi_materials(object):
     {2[13]:{width}}! - Conductivity (W/m-K)\n\n".format(name + ",", thickness + ",", stringmat, width = s-4))
     
     def gmat_write(self, idf_file, name, stringmat, thickness):           
-        idf_file.write("WindowMaterial:{1[0]}\n\
+        idf_file.write("WindowMaterial:{1[0]},\n\
     {0:{width}}! - Name\n\
     {1[1]:{width}}! - Gas Type\n\
     {2:{width}}! - Thickness\n\n".format(name + ",", stringmat, thickness + ";", width = s-4))   
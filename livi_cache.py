@@ -0,0 +1,83 @@
+import bpy, os, hashlib, shutil
+from array import array
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+# Content addressed store for Radiance export artefacts. Files are kept in a cache folder in the
+# export directory and named by a hash of everything that went into producing them.
+
+def cachepath(node, key, ext):
+    cachedir = os.path.join(node.newdir, 'cache')
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+    return(os.path.join(cachedir, key + ext))
+
+def textkey(*args):
+    return(hashlib.sha1(''.join([str(arg) for arg in args]).encode('utf-8')).hexdigest())
+
+def filekey(path):
+    filehash = hashlib.sha1()
+    with open(path, 'rb') as hashfile:
+        for block in iter(lambda: hashfile.read(1 << 20), b''):
+            filehash.update(block)
+    return(filehash.hexdigest())
+
+def obkey(ob, scene, *args):
+    mesh = ob.to_mesh(scene, True, 'PREVIEW', calc_tessface=False)
+    obhash = hashlib.sha1()
+    for elements, attr, atype in ((mesh.vertices, 'co', 'f'), (mesh.vertices, 'normal', 'f'), (mesh.loops, 'vertex_index', 'i'), (mesh.polygons, 'loop_total', 'i'),
+                                  (mesh.polygons, 'material_index', 'i'), (mesh.polygons, 'use_smooth', 'i')):
+        vals = array(atype, [0]) * (len(elements) * (3, 1)[attr not in ('co', 'normal')])
+        elements.foreach_get(attr, vals)
+        obhash.update(vals.tobytes())
+    obhash.update(textkey([list(row) for row in ob.matrix_world], [mat.name for mat in mesh.materials], *args).encode('utf-8'))
+    bpy.data.meshes.remove(mesh)
+    return(obhash.hexdigest())
+
+def ambparams(params):
+    # The ambient calculation options in a Radiance parameter string, without file options
+    tokens = params.split()
+    ambs = []
+    for t, token in enumerate(tokens[:-1]):
+        if token[:2] == '-a' and token not in ('-af', '-ai', '-ae', '-aI', '-aE'):
+            try:
+                ambs.append('{} {}'.format(token, float(tokens[t + 1])))
+            except ValueError:
+                pass
+    return(' '.join(ambs))
+
+def scenekey(radtext, meshkeys):
+    # Key of a Radiance scene independent of the frame it was exported for. Mesh file names, which can
+    # carry frame numbers, are replaced by the hashes of their contents.
+    for meshfile, meshkey in meshkeys:
+        radtext = radtext.replace(meshfile, meshkey)
+    return(textkey('scene', radtext))
+
+def ambfile(node, scenekey, params):
+    # Ambient file of a scene and its ambient options. Frames and runs with the same scene share it;
+    # changed geometry, materials or sky, or changed -ab, -ad, -ar etc., give a new file.
+    return(cachepath(node, textkey('ambient', scenekey, ambparams(params)), '.amb'))
+
+def fetch(node, key, ext, target):
+    if os.path.isfile(cachepath(node, key, ext)):
+        shutil.copyfile(cachepath(node, key, ext), target)
+        return(1)
+    return(0)
+
+def store(node, key, ext, source):
+    if os.path.isfile(source) and os.path.getsize(source):
+        shutil.copyfile(source, cachepath(node, key, ext))
+
+def fetcharrays(node, key):
+    if np == 1 and os.path.isfile(cachepath(node, key, '.npz')):
+        with numpy.load(cachepath(node, key, '.npz')) as arrays:
+            return({name: arrays[name] for name in arrays.files})
+    return({})
+
+def storearrays(node, key, **arrays):
+    if np == 1:
+        numpy.savez(cachepath(node, key, '.npz'), **arrays)
@@ -21,16 +21,21 @@ from math import pi
 from subprocess import PIPE, Popen, STDOUT
 from . import vi_func
 from . import livi_export
+from . import livi_sched
+from . import livi_cache
+from . import livi_store
 
 try:
     import numpy
+    from . import livi_cbdm
     np = 1
 except:
     np = 0
 
-def radfexport(scene, export_op, connode, geonode, frames):
+def radfexport(scene, export_op, connode, geonode, frames, gen = 0):
+    # Generative candidates are rebuilt from their own scenes as radfiles only holds the last one exported
     for frame in frames:
-        livi_export.fexport(scene, frame, export_op, connode, geonode, pause = 1)
+        livi_export.fexport(scene, frame, export_op, connode, geonode, pause = 1, georad = geonode['genradfiles'][str(frame)] if gen else '')
 
 def rad_prev(prev_op, simnode, connode, geonode, simacc):    
     scene = bpy.context.scene    
@@ -50,9 +55,39 @@ def rad_prev(prev_op, simnode, connode, geonode, simacc):
     else:
         prev_op.report({'ERROR'},"Missing export file. Make sure you have exported the scene or that the current frame is within the exported frame range.")
 
+def dccalc(scene, simnode, connode, geonode, frames, simw):
+    # Daylight coefficient time series for static geometry. One rcontrib pass gives each sensor's
+    # contribution from the Tregenza sky patches and from a unit sun at each frame's sun position, then
+    # frame results are sums of these weighted by the frame's genskyvec sky vector and sun radiance.
+    # Returns binary float32 results per frame, or an empty list if the run failed.
+    skies = [livi_export.dcsky(connode['skyfiles'][frame - scene.fs]) for frame in frames]
+    dctext, sunmods = livi_export.dcscene(skies)
+    Popen("oconv -w - > {}-dc.oct".format(geonode.filebase), shell = True, stdin = PIPE, stdout=PIPE, stderr=STDOUT).communicate(input = (dctext + geonode['radfiles'][0]).encode('utf-8'))
+    with open(geonode.filebase+"-dc.mod", 'w') as modfile:
+        modfile.write(''.join([sunmod + '\n' for sunmod in sunmods]))
+    for f, frame in enumerate(frames):
+        with open("{}-{}-dc.sky".format(geonode.filebase, frame), 'w') as skyfile:
+            skyfile.write(skies[f][0])
+    vecouts = livi_sched.runjobs(["genskyvec -m 1 -c .8 .8 1 < {}-{}-dc.sky".format(geonode.filebase, frame) for frame in frames], int(geonode.nproc), label = 'genskyvec')
+    skyvecs = [livi_export.skyvec(vecout[0]) for vecout in vecouts]
+    if any([len(vec) != 146 for vec in skyvecs]):
+        return([])
+
+    sensn, senschunks = (geonode.nproc, [geonode.filebase+".rtrace"]) if livi_sched.forks() else (1, livi_sched.splitpoints(geonode.filebase+".rtrace", int(geonode.nproc)))
+    dccmds = [geonode.cat+ptsfile+" | rcontrib -w  -h -I -fo -faf "+simnode['radparams']+" -n "+str(sensn)+(" -M {}-dc.mod".format(geonode.filebase) if sunmods else '')+" -f tregenza.cal -b tbin -bn 146 -m sky_glow "+geonode.filebase+"-dc.oct" for ptsfile in senschunks]
+    dcout = livi_sched.joinjobs(livi_sched.runjobs(dccmds, len(dccmds), label = 'rcontrib'), len(dccmds))[0]
+    ncols = 3 * (len(sunmods) + 146)
+    if livi_sched.raderror(dcout) or len(dcout[0]) != 4 * ncols * geonode['reslen']:
+        return([])
+    contribs = livi_sched.rcvals(dcout[0], ncols, 1).reshape(geonode['reslen'], -1, 3)
+    suns = {s: c for c, s in enumerate([s for s, sky in enumerate(skies) if sky[1]])}
+    sunvals = [(suns[s], sky[1]) if sky[1] else None for s, sky in enumerate(skies)]
+    dcres = livi_cbdm.dcseries(contribs[:, len(sunmods):], skyvecs, contribs[:, :len(sunmods)], sunvals, *simw)
+    return([(dcr.astype(numpy.float32).tobytes(), '') for dcr in dcres])
+
 def li_calc(calc_op, simnode, connode, geonode, simacc, **kwargs): 
     scene = bpy.context.scene
-    frames = range(scene.fs, scene.fe + 1) if not kwargs.get('genframe') else [kwargs['genframe']]
+    frames = range(scene.fs, scene.fe + 1) if not kwargs.get('genframe') else kwargs.get('genframes') or [kwargs['genframe']]
     os.chdir(geonode.newdir)
     if bpy.context.active_object and bpy.context.active_object.mode != 'OBJECT':
         bpy.ops.object.mode_set(mode = 'OBJECT')
@@ -64,93 +99,133 @@ def li_calc(calc_op, simnode, connode, geonode, simacc, **kwargs):
         else:
             res, svres = [[[0 for p in range(geonode['reslen'])] for x in range(len(frames))] for x in range(2)]
 
-        for frame in frames:            
-            findex = frame - scene.fs if not kwargs.get('genframe') else 0
-            if connode.bl_label in ('LiVi Basic', 'LiVi Compliance') or (connode.bl_label == 'LiVi CBDM' and int(connode.analysismenu) < 2):
+        rtouts, svouts = [], []
+        workers, rtnproc, nchunks = livi_sched.pointjobs(geonode.nproc, len(frames))
+        ptsfiles = livi_sched.splitpoints(geonode.filebase+".rtrace", nchunks)
+        if connode.bl_label in ('LiVi Basic', 'LiVi Compliance') or (connode.bl_label == 'LiVi CBDM' and int(connode.analysismenu) < 2):
+            for frame in frames:
                 if os.path.isfile("{}-{}.af".format(geonode.filebase, frame)):
                     subprocess.call("{} {}-{}.af".format(geonode.rm, geonode.filebase, frame), shell=True)
-                rtcmd = "rtrace -n {0} -w {1} -faa -h -ov -I {2}-{3}.oct  < {2}.rtrace {4}".format(geonode.nproc, simnode['radparams'], geonode.filebase, frame, connode['simalg']) #+" | tee "+lexport.newdir+lexport.fold+self.simlistn[int(lexport.metric)]+"-"+str(frame)+".res"
-                rtrun = Popen(rtcmd, shell = True, stdout=PIPE, stderr=STDOUT)
+            rtfmt, rtalg = livi_sched.rtformat(connode['simalg'])
+            # Ambient files are shared by frames and runs of the same scene. Concurrent processes can only
+            # share one where Radiance locks the file, i.e. where it can fork.
+            afiles = {frame: livi_cache.ambfile(geonode, geonode['scenekeys'][str(frame)], simnode['radparams']) for frame in frames if simnode.ambcache and geonode.get('scenekeys') and str(frame) in geonode['scenekeys']}
+            if not livi_sched.forks() and (nchunks > 1 or len(set(afiles.values())) < len(afiles)):
+                afiles = {}
+            rtparams = {frame: simnode['radparams'] + (' -af {}'.format(afiles[frame]) if frame in afiles else '') for frame in frames}
+            if np == 1 and connode.bl_label == 'LiVi Basic' and connode.animmenu == 'Time' and connode.dcmode and connode['skynum'] < 3 \
+                and len(geonode['radfiles']) == 1 and len(frames) > 1 and not kwargs.get('genframe'):
+                # Only the sky changes between frames, so frame results come from one daylight coefficient pass
+                simw = livi_sched.simweights(connode['simalg'])
+                rtouts = dccalc(scene, simnode, connode, geonode, frames, simw) if simw else []
+                if rtouts:
+                    rtfmt = 'f'
+                else:
+                    print('Daylight coefficient run failed, tracing each frame')
+            if len(frames) == 1 and not kwargs.get('genframe') and nchunks == 1:
+                # Single frame runs go through an rtrace session that stays open for reruns on the same octree
+                with open(geonode.filebase+".rtrace", 'r') as rtfile:
+                    rtout = livi_sched.rtsession(geonode.filebase, "{}-{}.oct".format(geonode.filebase, frames[0]), rtparams[frames[0]], connode['simalg'], rtnproc, geonode.newdir).raw(rtfile.read())
+                rtouts = [(rtout, '')] if rtout is not None else []
+            if not rtouts:
+                rtcmds = ["rtrace -n {0} -w {1} -fa{5} -h -ov -I {2}-{3}.oct  < {6} {4}".format(rtnproc, rtparams[frame], geonode.filebase, frame, rtalg, rtfmt, ptsfile) for frame in frames for ptsfile in ptsfiles]
+                rtouts = livi_sched.joinjobs(livi_sched.runjobs(rtcmds, workers, label = 'rtrace'), nchunks)
+            rterrs = [rtout for rtout in rtouts if livi_sched.raderror(rtout)]
+            if rterrs:
+                print(rterrs[0][1] + ' rerunning export')
+                radfexport(scene, calc_op, connode, geonode, frames, gen = kwargs.get('genframe'))
+                if kwargs.get('genframe'):
+                    res = li_calc(calc_op, simnode, connode, geonode, simacc, genframe = kwargs.get('genframe'), genframes = kwargs.get('genframes'))
+                    return(res)                                
+                else:
+                    li_calc(calc_op, simnode, connode, geonode, simacc)
+                    return
+
+        if connode.bl_label == 'LiVi Compliance' and connode.analysismenu in ('0', '1'):
+            svfmt, svalg = livi_sched.rtformat(connode['simalg'])
+            svcmds = ["rtrace -n {0} -w {1} -fa{5} -h -ov -I -af {2}-{3}.af {2}-{3}.oct  < {6} {4}".format(rtnproc, '-ab 1 -ad 8192 -aa 0 -ar 512 -as 1024 -lw 0.0002', geonode.filebase, frame, svalg, svfmt, ptsfile) for frame in frames for ptsfile in ptsfiles]
+            svouts = livi_sched.joinjobs(livi_sched.runjobs(svcmds, workers, label = 'Sky view'), nchunks)
+
+        for frame in frames:            
+            findex = frame - scene.fs if not kwargs.get('genframe') else frames.index(frame)
+            if rtouts:
                 with open(os.path.join(geonode.newdir, connode['resname']+"-"+str(frame)+".res"), 'w') as resfile:
-                    for l,line in enumerate(rtrun.stdout):
-                        if 'octree' in line.decode() or 'mesh' in line.decode():
-                            print(line.decode() + ' rerunning export')
-                            resfile.close()
-                            radfexport(scene, calc_op, connode, geonode, frames)
-                            if kwargs.get('genframe'):
-                                res = li_calc(calc_op, simnode, connode, geonode, simacc, genframe = kwargs.get('genframe'))
-                                return(res)                                
-                            else:
-                                li_calc(calc_op, simnode, connode, geonode, simacc)
-                                return
-                        res[findex][l] = float(line.decode())
-                    resfile.write("{}".format(res).strip("]").strip("["))
+                    res[findex][:] = livi_sched.resvals(rtouts[findex][0], rtfmt == 'f')
+                    resfile.write("{}".format([float(r) for r in res[findex]]).strip("]").strip("["))
                 
-            if connode.bl_label == 'LiVi Compliance' and connode.analysismenu in ('0', '1'):
-                if connode.analysismenu in ('0', '1'):
-                    svcmd = "rtrace -n {0} -w {1} -h -ov -I -af {2}-{3}.af {2}-{3}.oct  < {2}.rtrace {4}".format(geonode.nproc, '-ab 1 -ad 8192 -aa 0 -ar 512 -as 1024 -lw 0.0002', geonode.filebase, frame, connode['simalg']) #+" | tee "+lexport.newdir+lexport.fold+self.simlistn[int(lexport.metric)]+"-"+str(frame)+".res"
-                    svrun = Popen(svcmd, shell = True, stdout=PIPE, stderr=STDOUT)
-                    with open(os.path.join(geonode.newdir,'skyview'+"-"+str(frame)+".res"), 'w') as svresfile:
-                        for sv,line in enumerate(svrun.stdout):
-                            svres[findex][sv] = float(line.decode())
-                        svresfile.write("{}".format(svres[findex]).strip("]").strip("["))
+            if svouts:
+                with open(os.path.join(geonode.newdir,'skyview'+"-"+str(frame)+".res"), 'w') as svresfile:
+                    svres[findex][:] = livi_sched.resvals(svouts[findex][0], svfmt == 'f')
+                    svresfile.write("{}".format([float(r) for r in svres[findex]]).strip("]").strip("["))
 
             if connode.bl_label == 'LiVi CBDM' and int(connode.analysismenu) > 1:
-                if connode.sourcemenu == '1':
-                    connode['vecvals'], vals = vi_func.mtx2vals(open(connode.mtxname, "r").readlines(), datetime.datetime(2010, 1, 1).weekday(), '')
-                hours = 0
-                sensarray = [[0 for x in range(146)] for y in range(geonode['reslen'])] if np == 0 else numpy.zeros([geonode['reslen'], 146])
+                if connode.sourcemenu == '1' and findex == 0:
+                    mtxkey = livi_cache.textkey(livi_cache.filekey(connode.mtxname), 'mtx')
+                    with open(connode.mtxname, "r") as mtxfile:
+                        livi_export.setsky(connode, mtxkey, livi_export.skycache(geonode, mtxkey, lambda: vi_func.mtx2vals(mtxfile, datetime.datetime(2010, 1, 1).weekday()))[0])
+                if findex == 0:
+                    # The sky subdivision is that of the sky matrix, which sets the rcontrib bins
+                    vecvals = livi_export.getsky(connode, geonode)
+                    mf = vi_func.skymf(len(vecvals[0]) - 2) if vecvals is not None and len(vecvals) else 0
+                    if not mf:
+                        calc_op.report({'ERROR'}, "The sky matrix is missing or is not a Tregenza or Reinhart sky. Try rerunning the context export")
+                        return
+                    npatches = vi_func.skypatches(mf)
                 oconvcmd = "oconv -w - > {0}-ws.oct".format(geonode.filebase)
                 Popen(oconvcmd, shell = True, stdin = PIPE, stdout=PIPE, stderr=STDOUT).communicate(input = (connode['whitesky']+geonode['radfiles'][frame]).encode('utf-8'))
-                senscmd = geonode.cat+geonode.filebase+".rtrace | rcontrib -w  -h -I -fo -bn 146 "+simnode['radparams']+" -n "+geonode.nproc+" -f tregenza.cal -b tbin -m sky_glow "+geonode.filebase+"-ws.oct"
-                sensrun = Popen(senscmd, shell = True, stdout=PIPE)
-
-                for li, line in enumerate(sensrun.stdout):
-                    decline = [float(ld) for ld in line.decode().split('\t') if ld != '\n']
-                    for v in range(0, 438, 3):
-                        if connode.analysismenu in ('2', '4'):
-                            sensarray[li][v/3] = 179*((decline[v]*0.265)+ (decline[v+1]*0.67) + (decline[v+2]*0.065))
-                        elif connode.analysismenu == '3':
-                            sensarray[li][v/3] = sum(decline[v:v+3])
-
-                for l, readings in enumerate(connode['vecvals']):
-                    if connode.analysismenu == '3' or (connode.cbdm_start_hour <= readings[:][0] < connode.cbdm_end_hour and readings[:][1] < connode['wd']):
-                        finalillu = [0 for x in range(geonode['reslen'])] if np == 0 else numpy.zeros((geonode['reslen']))
-                        for f, fi in enumerate(finalillu):
-                            finalillu[f] = numpy.sum([numpy.multiply(sensarray[f], readings[2:])]) if np == 1 else sum([a*b for a,b in zip(sensarray[f],readings[2:])])
-                        hours += 1
-
+                # Sensor chunks are traced concurrently when rcontrib cannot use -n
+                sensn, senschunks = (geonode.nproc, [geonode.filebase+".rtrace"]) if livi_sched.forks() else (1, livi_sched.splitpoints(geonode.filebase+".rtrace", int(geonode.nproc)))
+                senscmds = [geonode.cat+ptsfile+" | rcontrib -w  -h -I -fo -fa"+('a', 'f')[np]+" "+simnode['radparams']+" -n "+str(sensn)+" "+vi_func.skybins(mf)+" -m sky_glow "+geonode.filebase+"-ws.oct" for ptsfile in senschunks]
+                sensout = livi_sched.joinjobs(livi_sched.runjobs(senscmds, len(senscmds), label = 'rcontrib'), len(senscmds))[0][0]
+
+                if np == 1:
+                    sensarray = livi_cbdm.sensmatrix(livi_sched.rcvals(sensout, 3 * npatches, 1), connode.analysismenu)
+                    skyhours, skywd, skyvals = livi_cbdm.skymatrix(vecvals)
+                    if findex == 0:
+                        reswatt = numpy.zeros((len(frames), len(vecvals), geonode['reslen']), dtype = numpy.float32) if connode.analysismenu == '3' else []
+                        simnode['sda'], simnode['udi'] = {}, {}
+                    if connode.analysismenu == '3':
+                        reswatt[findex] = livi_cbdm.illuminance(sensarray, skyvals).T
+                    else:
+                        skyvals = skyvals[livi_cbdm.hourmask(skyhours, skywd, connode.cbdm_start_hour, connode.cbdm_end_hour, connode['wd'])]
                         if connode.analysismenu == '2':
-                            if np == 1:
-                                target = [reading >= connode.dalux for reading in finalillu]
-                                res[findex] = numpy.sum([res[findex], target], axis = 0)
-                            else:
+                            res[findex] = livi_cbdm.da(sensarray, skyvals, connode.dalux)
+                            simnode['sda'][str(frame)] = float(livi_cbdm.sda(res[findex]))
+                        else:
+                            udibins = livi_cbdm.udi(sensarray, skyvals, connode.damin, connode.dasupp, connode.daauto)
+                            res[findex] = udibins[2]
+                            simnode['udi'][str(frame)] = [float(numpy.average(udibin)) if len(udibin) else 0 for udibin in udibins]
+                        with open(os.path.join(geonode.newdir, connode['resname']+"-"+str(frame)+".res"), "w") as daresfile:
+                            daresfile.write(''.join(["{:.2f}\n".format(r) for r in res[findex]]))
+
+                else:
+                    hours = 0
+                    sensarray = [[0 for x in range(npatches)] for y in range(geonode['reslen'])]
+                    for li, line in enumerate(sensout.splitlines(True)):
+                        decline = [float(ld) for ld in line.decode().split('\t') if ld != '\n']
+                        for v in range(0, 3 * npatches, 3):
+                            if connode.analysismenu in ('2', '4'):
+                                sensarray[li][int(v/3)] = 179*((decline[v]*0.265)+ (decline[v+1]*0.67) + (decline[v+2]*0.065))
+                            elif connode.analysismenu == '3':
+                                sensarray[li][int(v/3)] = sum(decline[v:v+3])
+
+                    for l, readings in enumerate(vecvals):
+                        if connode.analysismenu == '3' or (connode.cbdm_start_hour <= readings[:][0] < connode.cbdm_end_hour and readings[:][1] < connode['wd']):
+                            finalillu = [sum([a*b for a,b in zip(sensarray[f],readings[2:])]) for f in range(geonode['reslen'])]
+                            hours += 1
+                            if connode.analysismenu == '2':
                                 res[findex] = [res[findex][k] + (0, 1)[finalillu[k] >= connode.dalux] for k in range(len(finalillu))]
-
-                        elif connode.analysismenu == '3':
-                            if np ==1:
-                                if hours == 1:
-                                    reswatt = numpy.zeros((len(frames), len(connode['vecvals']), geonode['reslen'])) 
-                                reswatt[findex][l] = finalillu
-                                for i in range(len(finalillu)):
-                                    numpy.append(res[findex][i], finalillu[i])                                
-                            else:
+                            elif connode.analysismenu == '3':
                                 res[findex].append(finalillu)
-                            
-                        elif connode.analysismenu == '4':
-                            if np == 1:
-                                target = [connode.daauto >= reading >= connode.dasupp for reading in finalillu]
-                                res[findex] = numpy.sum([res[findex], target], axis = 0)
-                            else:
+                            elif connode.analysismenu == '4':
                                 res[findex] = [res[findex][k] + (0, 1)[connode.daauto >= finalillu[k] >= connode.dasupp] for k in range(len(finalillu))]
                 
-                if connode.analysismenu in ('2', '4'):
-                    if np == 1 and hours != 0:
-                        res[findex] = res[frame]*100/hours
-                    elif  np == 0 and hours != 0:
-                        res[findex] = [rf*100/hours for rf in res[findex][0]]
-                    with open(os.path.join(geonode.newdir, connode['resname']+"-"+str(frame)+".res"), "w") as daresfile:
-                        [daresfile.write("{:.2f}\n".format(r)) for r in res[findex]]
+                    if connode.analysismenu in ('2', '4'):
+                        if hours != 0:
+                            res[findex] = [rf*100/hours for rf in res[findex]]
+                        with open(os.path.join(geonode.newdir, connode['resname']+"-"+str(frame)+".res"), "w") as daresfile:
+                            [daresfile.write("{:.2f}\n".format(r)) for r in res[findex]]
+                    reswatt = res
                 
                 if connode.analysismenu == '3':
                     res = reswatt
@@ -177,27 +252,93 @@ def li_calc(calc_op, simnode, connode, geonode, simacc, **kwargs):
                                 fi += 1
             
                         if (frame == scene.fs and not kwargs.get('genframe')) or (kwargs.get('genframe') and kwargs['genframe'] == scene.frame_start):
-                            geo['oave'], geo['omax'], geo['omin'], geo['oreslist'] = {}, {}, {}, {}
+                            geo['oave'], geo['omax'], geo['omin'] = {}, {}, {}
+                            livi_store.clear(geo, 'oreslist')
     
-                        geo['oave'][str(frame)] = weightres/(1, len(obcalcverts))[geonode.cpoint == '1'] 
-                        geo['omax'][str(frame)] = max(obres)
-                        geo['omin'][str(frame)] = min(obres)
-                        geo['oreslist'][str(frame)] = obres 
+                        geo['oave'][str(frame)] = float(weightres/(1, len(obcalcverts))[geonode.cpoint == '1'])
+                        geo['omax'][str(frame)] = float(max(obres))
+                        geo['omin'][str(frame)] = float(min(obres))
+                        livi_store.write(geonode, geo, 'oreslist', frame, obres)
                                    
         if not kwargs:
             
             resapply(calc_op, res, svres, simnode, connode, geonode)
             vi_func.vcframe('', scene, [ob for ob in scene.objects if ob.get('licalc')] , simnode['Animation'])
         else:
-            return(res[0])
+            return(res if kwargs.get('genframes') else res[0])
    
+def collut(lutsize = 1024):
+    # Result colour map from blue at the minimum to red at the maximum
+    lut = [colorsys.hsv_to_rgb(0.75*(1 - l/(lutsize - 1)), 1.0, 1.0) for l in range(lutsize)]
+    return(numpy.array(lut, dtype = numpy.float32) if np == 1 else lut)
+
+def rescolours(vals, minres, maxres, lut):
+    if np == 1:
+        return(lut[numpy.clip(numpy.rint((numpy.asarray(vals) - minres)/(maxres + 0.01 - minres) * (len(lut) - 1)).astype(int), 0, len(lut) - 1)])
+    else:
+        return([lut[min(max(int(round((v - minres)/(maxres + 0.01 - minres) * (len(lut) - 1))), 0), len(lut) - 1)] for v in vals])
+
+def svcolours(svvals):
+    # Green where the sky is visible, red elsewhere
+    if np == 1:
+        return(numpy.where((numpy.asarray(svvals) > 0)[:, None], numpy.array((0, 1, 0), dtype = numpy.float32), numpy.array((1, 0, 0), dtype = numpy.float32)))
+    else:
+        return([(0, 1, 0) if sv > 0 else (1, 0, 0) for sv in svvals])
+
+def loopsensors(geo, cpoint):
+    # Sensor index of every loop of a mesh, -1 for loops of faces without a sensor material, and the
+    # number of sensors. Sensors are the sensing faces or the geo['cverts'] vertices in export order.
+    mesh = geo.data
+    sensemats = [mat.livi_sense if mat else 0 for mat in mesh.materials]
+    if np == 1:
+        npolys = len(mesh.polygons)
+        matis, lstarts, ltotals = (numpy.zeros(npolys, dtype = numpy.int32) for x in range(3))
+        mesh.polygons.foreach_get('material_index', matis)
+        mesh.polygons.foreach_get('loop_start', lstarts)
+        mesh.polygons.foreach_get('loop_total', ltotals)
+        psense = numpy.array(sensemats, dtype = bool)[matis] if sensemats else numpy.zeros(npolys, dtype = bool)
+        loops = numpy.repeat(lstarts - numpy.cumsum(ltotals) + ltotals, ltotals) + numpy.arange(ltotals.sum())
+        lsens = numpy.full(len(mesh.loops), -1, dtype = int)
+        if cpoint == '1':
+            lverts = numpy.zeros(len(mesh.loops), dtype = numpy.int32)
+            mesh.loops.foreach_get('vertex_index', lverts)
+            vsens = numpy.full(len(mesh.vertices), -1, dtype = int)
+            vsens[numpy.array(geo['cverts'], dtype = int)] = numpy.arange(len(geo['cverts']))
+            lsens[loops] = numpy.where(numpy.repeat(psense, ltotals), vsens[lverts[loops]], -1)
+            return(lsens, len(geo['cverts']))
+        else:
+            lsens[loops] = numpy.repeat(numpy.where(psense, numpy.cumsum(psense) - 1, -1), ltotals)
+            return(lsens, int(psense.sum()))
+    else:
+        lsens, fi = [-1] * len(mesh.loops), 0
+        vsens = {v: vi for vi, v in enumerate(geo['cverts'])} if cpoint == '1' else {}
+        for face in mesh.polygons:
+            if sensemats and sensemats[face.material_index]:
+                for loop_index in face.loop_indices:
+                    lsens[loop_index] = vsens.get(mesh.loops[loop_index].vertex_index, -1) if cpoint == '1' else fi
+                fi += 1
+        return(lsens, len(vsens) if cpoint == '1' else fi)
+
+def loopcolours(mesh, name, lsens, cols):
+    # All loop colours of a new vertex colour layer are written in one call. Loops without a sensor stay white.
+    layer = mesh.vertex_colors.new(name = name)
+    if np == 1:
+        lcols = numpy.ones((len(lsens), 3), dtype = numpy.float32)
+        lcols[lsens >= 0] = cols[lsens[lsens >= 0]]
+        layer.data.foreach_set('color', lcols.ravel())
+    else:
+        layer.data.foreach_set('color', [c for l in lsens for c in (cols[l] if l >= 0 else (1, 1, 1))])
+    mesh.vertex_colors.active = layer
+    return(layer)
+
 def resapply(calc_op, res, svres, simnode, connode, geonode):
     scene = bpy.context.scene    
     if connode.analysismenu != '3' or connode.bl_label != 'LiVi CBDM':
         if np == 1:
-            simnode['maxres'] = list([numpy.amax(res[i]) for i in range(scene.fs, scene.fe + 1)])
-            simnode['minres'] = [numpy.amin(res[i]) for i in range(scene.fs, scene.fe + 1)]
-            simnode['avres'] = [numpy.average(res[i]) for i in range(scene.fs, scene.fe + 1)]
+            # ID properties only take Python numbers
+            simnode['maxres'] = [float(numpy.amax(res[i])) for i in range(scene.fs, scene.fe + 1)]
+            simnode['minres'] = [float(numpy.amin(res[i])) for i in range(scene.fs, scene.fe + 1)]
+            simnode['avres'] = [float(numpy.average(res[i])) for i in range(scene.fs, scene.fe + 1)]
         else:
             simnode['maxres'] = [max(res[i]) for i in range(scene.fs, scene.fe + 1)]
             simnode['minres'] = [min(res[i]) for i in range(scene.fs, scene.fe + 1)]
@@ -206,16 +347,12 @@ def resapply(calc_op, res, svres, simnode, connode, geonode):
         crits = []
         dfpass = [0 for f in range(scene.fs, scene.fe + 1)]
         edfpass = [0 for f in range(scene.fs, scene.fe + 1)]
+        minres, maxres, lut, loopsens = min(simnode['minres']), max(simnode['maxres']), collut(), {}
         
         for fr, frame in enumerate(range(scene.fs, scene.fe + 1)):
             scene.frame_set(frame)
-            fi = 0
-            dftotarea, dfpassarea, edfpassarea, edftotarea, mcol_i, fstart, fsv, sof, eof = 0, 0, 0, 0, 0, 0, 0, 0, 0
-            rgb, lcol_i = [], []
-            if connode.bl_label != 'LiVi CBDM' or connode.analysismenu != '3':
-                for i in range(len(res[fr])):
-                    h = 0.75*(1-(res[fr][i]-min(simnode['minres']))/(max(simnode['maxres']) + 0.01 - min(simnode['minres'])))
-                    rgb.append(colorsys.hsv_to_rgb(h, 1.0, 1.0))
+            dftotarea, dfpassarea, edfpassarea, edftotarea, fstart, soff, sof, eof = 0, 0, 0, 0, 0, 0, 0, 0
+            rgb = rescolours(res[fr], minres, maxres, lut)
         
             if bpy.context.active_object and bpy.context.active_object.hide == 'False':
                 bpy.ops.object.mode_set()
@@ -226,53 +363,25 @@ def resapply(calc_op, res, svres, simnode, connode, geonode):
                 geoarea = sum([vi_func.triarea(geo, face) for face in geo.data.polygons if geo.data.materials[face.material_index].livi_sense])
                 geofaces = [face for face in geo.data.polygons if geo.data.materials[face.material_index].livi_sense]
 
-                if geo.get('wattres'):
-                    del geo['wattres']
+                livi_store.clear(geo, 'wattres')
                 
                 fend = fstart + len(geofaces)
                 passarea = 0
                 vi_func.selobj(scene, geo)
-                bpy.ops.mesh.vertex_color_add()
-                geo.data.vertex_colors[-1].name = str(frame)
-                vertexColour = geo.data.vertex_colors[-1]
                 mat = [matslot.material for matslot in geo.material_slots if matslot.material.livi_sense][0]
-                mcol_i = len(tuple(set(lcol_i)))
-
-                for face in [face for face in geo.data.polygons if geo.data.materials[face.material_index].livi_sense]:
-                    if geonode.cpoint == '1':
-                        cvtup = tuple(geo['cverts'])
-                        for loop_index in face.loop_indices:
-                            v = geo.data.loops[loop_index].vertex_index
-                            if v in cvtup:
-                                col_i = cvtup.index(v)
-                            lcol_i.append(col_i)
-                            vertexColour.data[loop_index].color = rgb[col_i+mcol_i]
-        
-                    if geonode.cpoint == '0':
-                        for loop_index in face.loop_indices:
-                            vertexColour.data[loop_index].color = rgb[fi]
-                        fi += 1
+                # The loop to sensor index of each mesh is found once for all frames
+                if geo.name not in loopsens:
+                    loopsens[geo.name] = loopsensors(geo, geonode.cpoint)
+                lsens, nsens = loopsens[geo.name]
+                loopcolours(geo.data, str(frame), lsens, rgb[soff:soff + nsens])
+                soff += nsens
 
                 if connode.bl_label == 'LiVi Compliance':
                     if connode.analysismenu == '1':
-                        bpy.ops.mesh.vertex_color_add()
-                        geo.data.vertex_colors[frame+1].name = '{}sv'.format(frame)
-                        vertexColour = geo.data.vertex_colors[frame+1]
-                        for face in geo.data.polygons:
-                            if geo.data.materials[face.material_index].livi_sense:
-                                if geonode.cpoint == '1':
-                                    cvtup = tuple(geo['cverts'])
-                                    for loop_index in face.loop_indices:
-                                        v = geo.data.loops[loop_index].vertex_index
-                                        if v in cvtup:
-                                            col_i = cvtup.index(v)
-                                        lcol_i.append(col_i)
-                                        vertexColour.data[loop_index].color = rgb[col_i+mcol_i]
-
-                                elif geonode.cpoint == '0':
-                                    for loop_index in face.loop_indices:
-                                        vertexColour.data[loop_index].color = (0, 1, 0) if svres[frame][fsv] > 0 else (1, 0, 0)
-                                    fsv += 1
+                        if geonode.cpoint == '1':
+                            loopcolours(geo.data, '{}sv'.format(frame), lsens, rgb[soff - nsens:soff])
+                        else:
+                            loopcolours(geo.data, '{}sv'.format(frame), lsens, svcolours(svres[frame][soff - nsens:soff]))
 
                     if fr == 0:
                         crit, ecrit = [], []
@@ -590,18 +699,20 @@ def resapply(calc_op, res, svres, simnode, connode, geonode):
     else:
         for fr, frame in enumerate(range(scene.fs, scene.fe + 1)):
             scene.frame_set(frame)
-            sof, eof = 0, 0
+            sof = 0
             for geo in vi_func.retobjs('livic'):
                 bpy.ops.object.select_all(action = 'DESELECT')
                 scene.objects.active = None
-                geoarea = sum([vi_func.triarea(geo, face) for face in geo.data.polygons if geo.data.materials[face.material_index].livi_sense])
                 geofaces = [face for face in geo.data.polygons if geo.data.materials[face.material_index].livi_sense]
-                geo['wattres'] = {str(frame):[0 for x in range(len(res[0]))]}
-                faceareas = [vi_func.triarea(geo, fa) for fa in geofaces[sof:eof+len(geofaces)]]
-                for i in range(len(res[0])):
-                    geo['wattres'][str(frame)][i] = sum([res[fr][i][sof:eof+len(geofaces)][j] * faceareas[j] for j in range(sof, eof+len(geofaces))])
-                sof = len(geofaces)
-                eof += len(geofaces)
+                faceareas = [vi_func.triarea(geo, fa) for fa in geofaces]
+                eof = sof + len(geofaces)
+                if fr == 0:
+                    livi_store.clear(geo, 'wattres')
+                if np == 1:
+                    livi_store.write(geonode, geo, 'wattres', frame, numpy.dot(numpy.asarray(res[fr])[:, sof:eof], faceareas))
+                else:
+                    livi_store.write(geonode, geo, 'wattres', frame, [sum([hres[sof + j] * faceareas[j] for j in range(len(geofaces))]) for hres in res[fr]])
+                sof = eof
         simnode.outputs['Data out'].hide = False
             
     calc_op.report({'INFO'}, "Calculation is finished.")
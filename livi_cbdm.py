@@ -0,0 +1,61 @@
+import numpy
+
+# Climate based daylight modelling metrics. Sensor contributions (sensors x patches) are multiplied
+# by the sky matrix (hours x patches) to give sensor illuminances/irradiances (sensors x hours).
+# Patch counts follow the array shapes, so Tregenza and Reinhart skies go through the same code. Matrices
+# are float32 and products are taken a block of sensors at a time, sized so that a block of the
+# sensor x hour matrix stays within chunkcells values.
+
+chunkcells = 1 << 24
+
+def sensmatrix(rcvals, analysis):
+    rgb = numpy.asarray(rcvals, dtype = numpy.float32).reshape(len(rcvals), -1, 3)
+    if analysis in ('2', '4'):
+        return(numpy.dot(rgb, numpy.array((179 * 0.265, 179 * 0.67, 179 * 0.065), dtype = numpy.float32)))
+    else:
+        return(rgb.sum(axis = 2))
+
+def skymatrix(vecvals):
+    vecarray = numpy.asarray(vecvals, dtype = numpy.float32)
+    return(vecarray[:,0], vecarray[:,1], vecarray[:,2:])
+
+def hourmask(skyhours, skywd, starthour, endhour, wd):
+    return((starthour <= skyhours) & (skyhours < endhour) & (skywd < wd))
+
+def illuminance(sens, sky):
+    return(numpy.dot(numpy.asarray(sens, dtype = numpy.float32), numpy.asarray(sky, dtype = numpy.float32).T))
+
+def chunkreduce(sens, sky, func, chunk = None):
+    # Apply func to blocks of the sensor x hour product so the full matrix is never held in memory
+    chunk = chunk or max(1, chunkcells//max(1, len(sky)))
+    sky = numpy.asarray(sky, dtype = numpy.float32)
+    return(numpy.concatenate([func(illuminance(sens[c:c + chunk], sky)) for c in range(0, len(sens), chunk)]) if len(sens) else numpy.zeros(0))
+
+def hourpercent(counts, hours):
+    return(counts * 100/hours if hours else counts * 0)
+
+def da(sens, sky, dalux):
+    return(hourpercent(chunkreduce(sens, sky, lambda illu: (illu >= dalux).sum(axis = 1)), len(sky)))
+
+def udi(sens, sky, damin, dasupp, daauto):
+    # Percentage of hours fell short, supplementary, autonomous and exceeded for each sensor
+    bins = chunkreduce(sens, sky, lambda illu: numpy.column_stack(((illu < damin).sum(axis = 1), ((damin <= illu) & (illu < dasupp)).sum(axis = 1),
+                       ((dasupp <= illu) & (illu <= daauto)).sum(axis = 1), (illu > daauto).sum(axis = 1)))) if len(sens) else numpy.zeros((0, 4))
+    return([hourpercent(bins[:,b], len(sky)) for b in range(4)])
+
+def sda(dares, target = 50, areas = None):
+    # Percentage of the sensor area achieving the daylight autonomy target
+    areas = numpy.ones(len(dares)) if areas is None else numpy.asarray(areas, dtype = float)
+    return(100 * areas[dares >= target].sum()/areas.sum() if areas.sum() else 0)
+
+def dcseries(skycon, skyvecs, suncon, sunvals, weights, offset = 0):
+    # Frame x sensor results of a daylight coefficient run. skycon (sensors x patches x 3) is multiplied
+    # by the frame sky vectors (frames x patches x 3), and each frame with a sun adds its sun column of
+    # suncon (sensors x suns x 3) times the sun radiance. sunvals holds (column, RGB) or None per frame.
+    weights = numpy.asarray(weights, dtype = numpy.float32)
+    skyw = (numpy.asarray(skyvecs, dtype = numpy.float32) * weights).reshape(len(skyvecs), -1)
+    res = numpy.dot(skyw, skycon.reshape(len(skycon), -1).T) + offset
+    for f, sun in enumerate(sunvals):
+        if sun:
+            res[f] += numpy.dot(suncon[:, sun[0]], numpy.asarray(sun[1], dtype = numpy.float32) * weights)
+    return(res)
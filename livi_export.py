@@ -16,13 +16,14 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
-import bpy, os, math, subprocess, datetime
+import bpy, os, re, math, subprocess, datetime
 import time as ti
 from math import sin, cos, tan, pi
 from mathutils import Vector
 from subprocess import PIPE, Popen, STDOUT
 from .vi_func import retsky, retmat, retobj, retmesh, clearscene, \
-solarPosition, mtx2vals, retobjs, radmat, selobj
+solarPosition, mtx2vals, retobjs, radmat, selobj, skypatches, skybins
+from . import livi_cache, livi_sched
 
 try:
     import numpy
@@ -32,7 +33,7 @@ except:
 
 def radgexport(export_op, node, **kwargs):
     scene = bpy.context.scene
-    radfiles = []
+    radfiles, mattexts, meshkeys = [], {}, {}
 
     if export_op.nodeid.split('@')[0] == 'LiVi Geometry':
         clearscene(scene, export_op)
@@ -56,6 +57,7 @@ def radgexport(export_op, node, **kwargs):
                         if meshmat in list(o.data.materials):
                             o['merr'] = 1 
                         export_op.report({'INFO'}, o.name+" has a emission or mirror material. Basic export routine used with no modifiers.")
+                mattexts[meshmat.name] = (radname, matname, radnums)
                 meshmat['RadMat'] = {radname: (matname, radnums)}
                 meshmat.use_vertex_color_paint = 1 if meshmat.livi_sense else 0
             bpy.ops.object.select_all(action='DESELECT')
@@ -69,23 +71,30 @@ def radgexport(export_op, node, **kwargs):
         if frame in range(max(node['frames']['Geometry'], node['frames']['Material']) + 1):
             gframe = scene.frame_current if node['frames']['Geometry'] > 0 else 0
             mframe = scene.frame_current if node['frames']['Material'] > 0 else 0
-            gradfile = "# Geometry \n\n"
+            gradfile, statgrad, modgrad = "# Geometry \n\n", "", ""
             for o in retobjs('livig'):
+                gstart = len(gradfile)
+                gendir = kwargs.get('gendir') if kwargs.get('mo') and o in kwargs['mo'] else ''
                 if not kwargs.get('mo') or (kwargs.get('mo') and o in kwargs['mo']):
                     selobj(scene, o)
                     if o.get('merr') != 1:
                         if node.animmenu in ('Geometry'' Material'):# or export_op.nodeid.split('@')[0] == 'LiVi Simulation':
-                            bpy.ops.export_scene.obj(filepath=retobj(o.name, gframe, node), check_existing=True, filter_glob="*.obj;*.mtl", use_selection=True, use_animation=False, use_mesh_modifiers=True, use_edges=False, use_normals=o.data.polygons[0].use_smooth, use_uvs=True, use_materials=True, use_triangles=False, use_nurbs=True, use_vertex_groups=False, use_blen_objects=True, group_by_object=False, group_by_material=False, keep_vertex_order=False, global_scale=1.0, axis_forward='Y', axis_up='Z', path_mode='AUTO')
-                            objcmd = "obj2mesh -w -a {} {} {}".format(tempmatfilename, retobj(o.name, gframe, node), retmesh(o.name, max(gframe, mframe), node)) 
+                            objfile, matfile, meshfile = retobj(o.name, gframe, node), tempmatfilename, retmesh(o.name, max(gframe, mframe), node)
                         elif export_op.nodeid.split('@')[0] == 'LiVi Simulation':
-                            bpy.ops.export_scene.obj(filepath=retobj(o.name, scene.frame_start, node), check_existing=True, filter_glob="*.obj;*.mtl", use_selection=True, use_animation=False, use_mesh_modifiers=True, use_edges=False, use_normals=o.data.polygons[0].use_smooth, use_uvs=True, use_materials=True, use_triangles=False, use_nurbs=True, use_vertex_groups=False, use_blen_objects=True, group_by_object=False, group_by_material=False, keep_vertex_order=False, global_scale=1.0, axis_forward='Y', axis_up='Z', path_mode='AUTO')
-                            objcmd = "obj2mesh -w -a {} {} {}".format(retmat(scene.frame_start, node), retobj(o.name, scene.frame_start, node), retmesh(o.name, scene.frame_start, node))
+                            objfile, matfile, meshfile = retobj(o.name, scene.frame_start, node), retmat(scene.frame_start, node), retmesh(o.name, scene.frame_start, node)
+                        elif frame == scene.fs:
+                            objfile, matfile, meshfile = retobj(o.name, scene.frame_current, node), retmat(frame, node), retmesh(o.name, scene.frame_current, node)
                         else:
-                            if frame == scene.fs:                        
-                                bpy.ops.export_scene.obj(filepath=retobj(o.name, scene.frame_current, node), check_existing=True, filter_glob="*.obj;*.mtl", use_selection=True, use_animation=False, use_mesh_modifiers=True, use_edges=False, use_normals=o.data.polygons[0].use_smooth, use_uvs=True, use_materials=True, use_triangles=False, use_nurbs=True, use_vertex_groups=False, use_blen_objects=True, group_by_object=False, group_by_material=False, keep_vertex_order=False, global_scale=1.0, axis_forward='Y', axis_up='Z', path_mode='AUTO')
-                                objcmd = "obj2mesh -w -a {} {} {}".format(retmat(frame, node), retobj(o.name, scene.frame_current, node), retmesh(o.name, scene.frame_current, node))
-                            else:
-                                objcmd = ''
+                            objfile = ''
+                        objcmd = ''
+                        if objfile and gendir:
+                            objfile, meshfile = genpath(objfile, gendir), genpath(meshfile, gendir)
+                        if objfile:
+                            meshkey = livi_cache.obkey(o, scene, [mattexts.get(mat.name) for mat in o.data.materials], matfile, 'obj2mesh -w -a')
+                            if not livi_cache.fetch(node, meshkey, '.mesh', meshfile):
+                                bpy.ops.export_scene.obj(filepath=objfile, check_existing=True, filter_glob="*.obj;*.mtl", use_selection=True, use_animation=False, use_mesh_modifiers=True, use_edges=False, use_normals=o.data.polygons[0].use_smooth, use_uvs=True, use_materials=True, use_triangles=False, use_nurbs=True, use_vertex_groups=False, use_blen_objects=True, group_by_object=False, group_by_material=False, keep_vertex_order=False, global_scale=1.0, axis_forward='Y', axis_up='Z', path_mode='AUTO')
+                                objcmd = "obj2mesh -w -a {} {} {}".format(matfile, objfile, meshfile)
+                            meshkeys[meshfile] = meshkey
                         objrun = Popen(objcmd, shell = True, stdout = PIPE, stderr=STDOUT)
                         
                         for line in objrun.stdout:
@@ -93,11 +102,13 @@ def radgexport(export_op, node, **kwargs):
                                 export_op.report({'INFO'}, o.name+" has an incompatible mesh. Doing a simplified export")
                                 o['merr'] = 1
                                 break
+                        if objcmd and o.get('merr') != 1:
+                            livi_cache.store(node, meshkey, '.mesh', meshfile)
 
                         o.select = False
     
                 if o.get('merr') != 1:
-                    gradfile += "void mesh id \n1 "+retmesh(o.name, max(gframe, mframe), node)+"\n0\n0\n\n"
+                    gradfile += "void mesh id \n1 "+genpath(retmesh(o.name, max(gframe, mframe), node), gendir)+"\n0\n0\n\n"
                 else:
                     export_op.report({'INFO'}, o.name+" could not be converted into a Radiance mesh and simpler export routine has been used. No un-applied object modifiers will be exported.")
                     if o.get('merr'):
@@ -118,6 +129,10 @@ def radgexport(export_op, node, **kwargs):
                             gradfile += "\n"
                         except:
                             export_op.report({'ERROR'},"Make sure your object "+o.name+" has an associated material")
+                if kwargs.get('mo') and o in kwargs['mo']:
+                    modgrad += gradfile[gstart:]
+                else:
+                    statgrad += gradfile[gstart:]
 
         # Lights export routine
         if frame in range(node['frames']['Lights'] + 1):
@@ -140,60 +155,106 @@ def radgexport(export_op, node, **kwargs):
                             lradfile += "!xform -rx {:.3f} -ry {:.3f} -rz {:.3f} -t {:.3f} {:.3f} {:.3f} {}\n".format((180/pi)*rotation[0], (180/pi)*rotation[1], (180/pi)*rotation[2], fx, fy, fz, node.newdir+os.path.sep+iesname+"-"+str(frame)+".rad")
         sradfile = "# Sky \n\n"
         radfiles.append(mradfile+gradfile+lradfile+sradfile)
+        # Generative steps keep the unmodified scene apart so that its octree can be reused
+        if kwargs.get('mo'):
+            node['genstatic'], node['genmod'] = mradfile+statgrad+lradfile+sradfile, modgrad
     
     node['radfiles'] = radfiles
+    # Generative candidates are exported one after another, so each one's scene is kept by frame for reruns
+    if kwargs.get('genframe'):
+        if not node.get('genradfiles'):
+            node['genradfiles'] = {}
+        node['genradfiles'][str(kwargs['genframe'])] = radfiles[0]
+    node['meshkeys'] = [[meshfile, meshkeys[meshfile]] for meshfile in meshkeys]
     connode = node.outputs['Geometry out'].links[0].to_node if node.outputs['Geometry out'].is_linked else 0
 
     for frame in range(scene.fs, scene.gfe + 1):
-        fexport(scene, frame, export_op, node, connode)
+        fexport(scene, frame, export_op, node, connode, mo = kwargs.get('mo'))
 
 # rtrace export routine
     
-    reslen, rtpoints = 0, ''
+    reslen = 0
     geos = retobjs('livig') if export_op.nodeid.split('@')[0] == 'LiVi Geometry' else retobjs('livic')
     
-    for o, geo in enumerate(geos):
-        if len(geo.data.materials) > 0:
-            if len([f for f in geo.data.polygons if geo.data.materials[f.material_index].livi_sense]) > 0:
-                geo['licalc'], cverts, csfi, scene.objects.active, geo['cfaces'] = 1, [], [], geo, []
-                bpy.ops.object.mode_set(mode = 'EDIT')
-                bpy.ops.mesh.select_all(action='DESELECT')
-                bpy.ops.object.mode_set(mode = 'OBJECT')
-                mesh = geo.to_mesh(scene, True, 'PREVIEW', calc_tessface=False)
-                mesh.transform(geo.matrix_world)
-                scene.objects.active = geo
-                csf = [face for face in mesh.polygons if mesh.materials[face.material_index].livi_sense]
-                csfi = [f.index for f in csf]
-                if node.cpoint == '0':  
-                    reslen += len(csfi)
-                    for f in csf:
-                        fc = f.center
-                        rtpoints += '{0[0]} {0[1]} {0[2]} {1[0]} {1[1]} {1[2]} \n'.format(fc, f.normal.normalized()[:])
-                elif node.cpoint == '1':        
-                    csfvi = [item for sublist in [face.vertices[:] for face in mesh.polygons if mesh.materials[face.material_index].livi_sense] for item in sublist]
-                    cverts = [v for (i,v) in enumerate(csfvi) if v not in csfvi[0:i]]
-                    reslen += len(cverts)
-                    for vert in cverts:
-                        rtpoints += '{0[0]} {0[1]} {0[2]} {1[0]} {1[1]} {1[2]} \n'.format(mesh.vertices[vert].co[:], (mesh.vertices[vert].normal*geo.matrix_world.inverted()).normalized()[:])
-
-                (geo['cverts'], geo['cfaces']) = (cverts, csfi) if node.cpoint == '1' else ([], csfi)                   
-                bpy.data.meshes.remove(mesh)
-            else:
-                if geo.get('licalc'):
-                    del geo['licalc']
-                for mat in geo.material_slots:
-                    mat.material.use_transparent_shadows = True
-        else:
-            node.export = 0
-            export_op.report({'ERROR'},"Make sure your object "+geo.name+" has an associated material")
-        node['reslen'] = reslen
-    
     with open(node.filebase+".rtrace", "w") as rtrace:
-        rtrace.write(rtpoints)
+        for o, geo in enumerate(geos):
+            if len(geo.data.materials) > 0:
+                if len([f for f in geo.data.polygons if geo.data.materials[f.material_index].livi_sense]) > 0:
+                    geo['licalc'], scene.objects.active = 1, geo
+                    bpy.ops.object.mode_set(mode = 'EDIT')
+                    bpy.ops.mesh.select_all(action='DESELECT')
+                    bpy.ops.object.mode_set(mode = 'OBJECT')
+                    mesh = geo.to_mesh(scene, True, 'PREVIEW', calc_tessface=False)
+                    mesh.transform(geo.matrix_world)
+                    scene.objects.active = geo
+                    # cfaces/cverts map each calculation point, in file order, to its face/vertex index
+                    pos, dirs, csfi, cverts = calcpoints(mesh, geo.matrix_world.inverted(), node.cpoint)
+                    reslen += len(pos)
+                    if np == 1:
+                        rtrace.write('%.9g %.9g %.9g %.9g %.9g %.9g \n' * len(pos) % tuple(numpy.hstack((pos, dirs)).ravel()))
+                    else:
+                        rtrace.writelines(['{0[0]} {0[1]} {0[2]} {1[0]} {1[1]} {1[2]} \n'.format(p, d) for p, d in zip(pos, dirs)])
+                    (geo['cverts'], geo['cfaces']) = (cverts, csfi)
+                    bpy.data.meshes.remove(mesh)
+                else:
+                    if geo.get('licalc'):
+                        del geo['licalc']
+                    for mat in geo.material_slots:
+                        mat.material.use_transparent_shadows = True
+            else:
+                node.export = 0
+                export_op.report({'ERROR'},"Make sure your object "+geo.name+" has an associated material")
+            node['reslen'] = reslen
     
     scene.fe = max(scene.cfe, scene.gfe)
     node.export = 1
 
+def calcpoints(mesh, invmatrix, cpoint):
+    # Positions and directions of the calculation points of a world space mesh with the sensing face
+    # indices and, for vertex points, the unique sensing vertex indices in first use order.
+    # Vertex normals are taken back through the inverse object matrix as in earlier exports.
+    sensemats = [mat.livi_sense if mat else 0 for mat in mesh.materials]
+    if np == 1:
+        npolys, nverts = len(mesh.polygons), len(mesh.vertices)
+        matis, lstarts, ltotals, lverts = numpy.zeros(npolys, dtype = numpy.int32), numpy.zeros(npolys, dtype = numpy.int32), numpy.zeros(npolys, dtype = numpy.int32), numpy.zeros(len(mesh.loops), dtype = numpy.int32)
+        mesh.polygons.foreach_get('material_index', matis)
+        csfi = numpy.flatnonzero(numpy.array(sensemats, dtype = bool)[matis]) if sensemats else numpy.zeros(0, dtype = int)
+        if cpoint == '0':
+            centres, normals = numpy.zeros(npolys * 3), numpy.zeros(npolys * 3)
+            mesh.polygons.foreach_get('center', centres)
+            mesh.polygons.foreach_get('normal', normals)
+            normals = normals.reshape(-1, 3)[csfi]
+            lengths = numpy.linalg.norm(normals, axis = 1)
+            return(centres.reshape(-1, 3)[csfi], normals/numpy.where(lengths, lengths, 1)[:, None], csfi.tolist(), [])
+        else:
+            mesh.polygons.foreach_get('loop_start', lstarts)
+            mesh.polygons.foreach_get('loop_total', ltotals)
+            mesh.loops.foreach_get('vertex_index', lverts)
+            # Loop indices of the sensing faces without a per face Python loop
+            counts = ltotals[csfi]
+            sloops = numpy.repeat(lstarts[csfi] - numpy.cumsum(counts) + counts, counts) + numpy.arange(counts.sum())
+            uverts, firsts = numpy.unique(lverts[sloops], return_index = True)
+            cverts = uverts[numpy.argsort(firsts)]
+            vcos, vnormals = numpy.zeros(nverts * 3), numpy.zeros(nverts * 3)
+            mesh.vertices.foreach_get('co', vcos)
+            mesh.vertices.foreach_get('normal', vnormals)
+            normals = numpy.dot(vnormals.reshape(-1, 3)[cverts], numpy.array(invmatrix)[:3, :3])
+            lengths = numpy.linalg.norm(normals, axis = 1)
+            return(vcos.reshape(-1, 3)[cverts], normals/numpy.where(lengths, lengths, 1)[:, None], csfi.tolist(), cverts.tolist())
+    else:
+        csf = [face for face in mesh.polygons if sensemats and sensemats[face.material_index]]
+        csfi = [face.index for face in csf]
+        if cpoint == '0':
+            return([face.center[:] for face in csf], [face.normal.normalized()[:] for face in csf], csfi, [])
+        else:
+            cverts, seen = [], set()
+            for face in csf:
+                for v in face.vertices:
+                    if v not in seen:
+                        seen.add(v)
+                        cverts.append(v)
+            return([mesh.vertices[v].co[:] for v in cverts], [(mesh.vertices[v].normal*invmatrix).normalized()[:] for v in cverts], csfi, cverts)
+
 def radcexport(export_op, node):
     skyfileslist, scene, scene.li_disp_panel, scene.vi_display = [], bpy.context.scene, 0, 0
     clearscene(scene, export_op)
@@ -244,45 +305,26 @@ def radcexport(export_op, node):
                     export_op.report({'ERROR'}, "End month is earlier than start month")
                     return
                 os.chdir(geonode.newdir)
-                pcombfiles = ""
-                for i in range(0, 146):
-                    pcombfiles = pcombfiles + "ps{}.hdr ".format(i)
                 epwbase = os.path.splitext(os.path.basename(locnode.weather))
                 if epwbase[1] in (".epw", ".EPW"):
                     with open(locnode.weather, "r") as epwfile:
-                        epwlines = epwfile.readlines()
-                        epwyear = epwlines[8].split(",")[0]
-                        with open(geonode.newdir+os.path.sep+epwbase[0]+".wea", "w") as wea:
-                            wea.write("place {0[1]}\nlatitude {0[6]}\nlongitude {0[7]}\ntime_zone {0[8]}\nsite_elevation {0[9]}weather_data_file_units 1\n".format(epwlines[0].split(",")))
-                            for epwline in epwlines[8:]:
-                                if int(epwline.split(",")[1]) in range(locnode.startmonth, locnode.endmonth + 1):
-                                    wea.write("{0[1]} {0[2]} {0[3]} {0[14]} {0[15]} \n".format(epwline.split(",")))
-                        subprocess.call("gendaymtx -m 1 {0} {1}.wea > {1}.mtx".format(('', '-O1')[node.analysismenu in ('1', '3')], geonode.newdir+os.path.sep+epwbase[0]), shell=True)                       
+                        epwyear = [epwfile.readline() for l in range(9)][8].split(",")[0]
+                    mtxargs = "-m {} {}".format(node.skysub, ('', '-O1')[node.analysismenu in ('1', '3')])
+                    skykey = livi_cache.textkey(livi_cache.filekey(locnode.weather), locnode.startmonth, locnode.endmonth, 'gendaymtx', mtxargs)
+                    vecvals, vals = skycache(geonode, skykey, lambda: epwmtx(locnode, geonode.newdir+os.path.sep+epwbase[0], mtxargs, datetime.datetime(int(epwyear), 1, 1).weekday(), skypatches(int(node.skysub))))
                 else:
                     export_op.report({'ERROR'}, "Not a valid EPW file")
                     return
     
-                mtxfile = open(geonode.newdir+os.path.sep+epwbase[0]+".mtx", "r")
-            
-            elif node['source'] == '1' and int(node.analysismenu) > 1:
-                mtxfile = open(node.mtxname, "r")
-    
             if node['source'] == '0':
                 if node.inputs['Location in'].is_linked:
-                    mtxlines = mtxfile.readlines()
-                    vecvals, vals = mtx2vals(mtxlines, datetime.datetime(int(epwyear), 1, 1).weekday(), locnode)
-                    mtxfile.close()
-                    node['vecvals'] = vecvals
+                    setsky(node, skykey, vecvals)
                     node['whitesky'] = "void glow sky_glow \n0 \n0 \n4 1 1 1 0 \nsky_glow source sky \n0 \n0 \n4 0 0 1 180 \nvoid glow ground_glow \n0 \n0 \n4 1 1 1 0 \nground_glow source ground \n0 \n0 \n4 0 0 -1 180\n\n"
                     oconvcmd = "oconv -w - > {0}-whitesky.oct".format(geonode.filebase)
                     Popen(oconvcmd, shell = True, stdin = PIPE, stdout=PIPE, stderr=STDOUT).communicate(input = node['whitesky'].encode('utf-8'))
                     if int(node.analysismenu) < 2 or node.hdr:
-                        subprocess.call("vwrays -ff -x 600 -y 600 -vta -vp 0 0 0 -vd 0 1 0 -vu 0 0 1 -vh 360 -vv 360 -vo 0 -va 0 -vs 0 -vl 0 | rcontrib -bn 146 -fo -ab 0 -ad 1 -n {} -ffc -x 600 -y 600 -ld- -V+ -f tregenza.cal -b tbin -o p%d.hdr -m sky_glow {}-whitesky.oct".format(geonode.nproc, geonode.filename), shell = True)
-                        for j in range(0, 146):
-                            subprocess.call("pcomb -s {0} p{1}.hdr > ps{1}.hdr".format(vals[j], j), shell = True)
-                            subprocess.call("{0}  p{1}.hdr".format(geonode.rm, j), shell = True)        
-                        subprocess.call("pcomb -h  "+pcombfiles+" > "+geonode.newdir+os.path.sep+epwbase[0]+".hdr", shell = True)
-                        subprocess.call(geonode.rm+" ps*.hdr" , shell = True)
+                        subprocess.call("vwrays -ff -x 600 -y 600 -vta -vp 0 0 0 -vd 0 1 0 -vu 0 0 1 -vh 360 -vv 360 -vo 0 -va 0 -vs 0 -vl 0 | rcontrib -fo -ab 0 -ad 1 -n {} -ffc -x 600 -y 600 -ld- -V+ {} -o p%d.hdr -m sky_glow {}-whitesky.oct".format(geonode.nproc, skybins(int(node.skysub)), geonode.filename), shell = True)
+                        patchcombine(vals, geonode.newdir, geonode.newdir+os.path.sep+epwbase[0]+".hdr", geonode.nproc)
                         node.hdrname = geonode.newdir+os.path.sep+epwbase[0]+".hdr"
                     
                     if node.hdr:
@@ -303,6 +345,72 @@ def radcexport(export_op, node):
     scene.frame_set(scene.fs)
     node.export = 1
 
+def epwmtx(locnode, mtxbase, mtxargs, fwd, npatches):
+    # EPW to wea conversion and gendaymtx run, streaming the weather and matrix files
+    with open(locnode.weather, "r") as epwfile, open(mtxbase+".wea", "w") as wea:
+        for l, epwline in enumerate(epwfile):
+            if l == 0:
+                wea.write("place {0[1]}\nlatitude {0[6]}\nlongitude {0[7]}\ntime_zone {0[8]}\nsite_elevation {0[9]}weather_data_file_units 1\n".format(epwline.split(",")))
+            elif l > 7 and int(epwline.split(",")[1]) in range(locnode.startmonth, locnode.endmonth + 1):
+                wea.write("{0[1]} {0[2]} {0[3]} {0[14]} {0[15]} \n".format(epwline.split(",")))
+    subprocess.call("gendaymtx {0} {1}.wea > {1}.mtx".format(mtxargs, mtxbase), shell=True)
+    with open(mtxbase+".mtx", "r") as mtxfile:
+        return(mtx2vals(mtxfile, fwd, npatches))
+
+def skycache(geonode, skykey, build):
+    # Parsed sky matrices are kept as binary arrays in the export cache, keyed by their inputs
+    skyarrays = livi_cache.fetcharrays(geonode, skykey)
+    if skyarrays:
+        return(skyarrays['vecvals'], skyarrays['vals'])
+    vecvals, vals = build()
+    livi_cache.storearrays(geonode, skykey, vecvals = vecvals, vals = vals)
+    return(vecvals, vals)
+
+def setsky(node, skykey, vecvals):
+    # With numpy the sky matrix, which is hours x patches and large for fine subdivisions, stays in the
+    # export cache and the node keeps its key. Otherwise the values are kept on the node.
+    if np == 1:
+        node['skykey'] = skykey
+        if node.get('vecvals') is not None:
+            del node['vecvals']
+    else:
+        node['vecvals'] = vecvals
+        if node.get('skykey') is not None:
+            del node['skykey']
+
+def getsky(node, geonode):
+    if np == 1 and node.get('skykey'):
+        return(livi_cache.fetcharrays(geonode, node['skykey']).get('vecvals'))
+    return(node.get('vecvals'))
+
+def patchcombine(vals, newdir, hdrfile, nproc, maxinputs = 64):
+    # Sum the sky patch images weighted by patch values. Patches are scaled and summed in multi-input pcomb
+    # jobs run concurrently, instead of one pcomb per patch, and the partial images are then summed in a
+    # tree. No pcomb gets more than maxinputs images, which keeps within pcomb's input limit, open file
+    # limits and command line lengths for Reinhart skies with thousands of patches.
+    patches = [os.path.join(newdir, 'p{}.hdr'.format(j)) for j in range(len(vals))]
+    lit = [j for j in range(len(vals)) if vals[j] > 0] or [0]
+    workers, n = livi_sched.framejobs(nproc, len(lit))
+    chunk = min(-(-len(lit)//workers), maxinputs)
+    parts = [os.path.join(newdir, 'ps0-{}.hdr'.format(c)) for c in range(-(-len(lit)//chunk))]
+    cmds = ['pcomb -h {} > "{}"'.format(' '.join(['-s {} "{}"'.format(vals[j], patches[j]) for j in lit[c * chunk: (c + 1) * chunk]]), part) for c, part in enumerate(parts)]
+    tempfiles, level = patches + parts, 0
+    while cmds:
+        for result in livi_sched.runjobs(cmds, workers, 'Sky patches'):
+            if result[1]:
+                print(result[1])
+        if len(parts) > 1:
+            level += 1
+            sums = [os.path.join(newdir, 'ps{}-{}.hdr'.format(level, c)) for c in range(-(-len(parts)//maxinputs))]
+            cmds = ['pcomb -h {} > "{}"'.format(' '.join(['"{}"'.format(part) for part in parts[c * maxinputs: (c + 1) * maxinputs]]), psum) for c, psum in enumerate(sums)]
+            parts, tempfiles = sums, tempfiles + sums
+        else:
+            cmds = []
+    os.replace(parts[0], hdrfile)
+    for tempfile in tempfiles:
+        if os.path.isfile(tempfile):
+            os.remove(tempfile)
+
 def sunexport(scene, node, geonode, locnode, frame): 
     if locnode:
         simtime = node.starttime + frame*datetime.timedelta(seconds = 3600*node.interval)
@@ -355,15 +463,45 @@ def skyexport(node, rad_sky):
 def hdrsky(skyfile):
     return("# Sky material\nvoid colorpict hdr_env\n7 red green blue {} angmap.cal sb_u sb_v\n0\n0\n\nhdr_env glow env_glow\n0\n0\n4 1 1 1 0\n\nenv_glow bubble sky\n0\n0\n4 0 0 0 5000\n\n".format(skyfile))
 
+def dcsky(skytext):
+    # Split a gensky frame sky into the sky brightness description without the sun or glow, the sun's
+    # RGB radiance and its direction and angle. The last two are None when the sky has no sun.
+    skytext = skytext.split('\nskyfunc glow skyglow')[0]
+    sun = re.search(r'void\s+light\s+solar\s+0\s+0\s+3\s+(\S+)\s+(\S+)\s+(\S+)\s+solar\s+source\s+sun\s+0\s+0\s+4\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)', skytext)
+    if not sun:
+        return((skytext, None, None))
+    vals = [float(v) for v in sun.groups()]
+    return((skytext[:sun.start()] + skytext[sun.end():], vals[:3], vals[3:]))
+
+def dcscene(skies):
+    # Sky patch glow plus a unit radiance sun source for each frame sky with a sun, and the sun modifiers
+    suns = [s for s, sky in enumerate(skies) if sky[1]]
+    suntext = ''.join(["void light solar{0}\n0\n0\n3 1 1 1\n\nsolar{0} source sun{0}\n0\n0\n4 {1[0]} {1[1]} {1[2]} {1[3]}\n\n".format(s, skies[s][2]) for s in suns])
+    return("void glow sky_glow\n0\n0\n4 1 1 1 0\n\nsky_glow source sky\n0\n0\n4 0 0 1 180\n\n" + suntext, ['solar{}'.format(s) for s in suns])
+
+def skyvec(out):
+    # Patch RGB values from genskyvec output, skipping any header
+    vec = []
+    for line in out.decode().splitlines():
+        try:
+            vals = [float(v) for v in line.split()]
+        except ValueError:
+            continue
+        if len(vals) == 3:
+            vec.append(vals)
+    return(vec)
+
 def fexport(scene, frame, export_op, node, othernode, **kwargs):
     pt = 0.2 if not kwargs.get('pause') else 0.5
     (geonode, connode) = (node, othernode) if 'LiVi Geometry' in node.bl_label else (othernode, node)
     
+    skytext = ''
     if not connode or not connode.get('skyfiles'):
-        radtext = geonode['radfiles'][0] if scene.gfe == 0 else geonode['radfiles'][frame]
+        radtext = kwargs.get('georad') or (geonode['radfiles'][0] if scene.gfe == 0 else geonode['radfiles'][frame])
     elif connode:
         skyframe = frame if scene.cfe > 0 else 0
-        radtext = geonode['radfiles'][0] + connode['skyfiles'][skyframe] if len(geonode['radfiles']) == 1 else geonode['radfiles'][frame] + connode['skyfiles'][0]
+        skytext = connode['skyfiles'][skyframe] if len(geonode['radfiles']) == 1 else connode['skyfiles'][0]
+        radtext = (kwargs.get('georad') or (geonode['radfiles'][0] if len(geonode['radfiles']) == 1 else geonode['radfiles'][frame])) + skytext
 
     with open(geonode.filebase+"-{}.rad".format(frame), 'w') as radfile:
         radfile.write(radtext)
@@ -374,18 +512,63 @@ def fexport(scene, frame, export_op, node, othernode, **kwargs):
     bpy.data.texts['Radiance input-{}'.format(frame)].write(radtext)
     
     oconvcmd = "oconv -w {0}-{1}.rad > {0}-{1}.oct".format(geonode.filebase, frame)
+    octkey = livi_cache.textkey(oconvcmd, radtext, [meshkey for meshfile, meshkey in geonode.get('meshkeys', []) if meshfile in radtext])
+    if not geonode.get('octkeys'):
+        geonode['octkeys'] = {}
+    geonode['octkeys'][str(frame)] = octkey
+    if not geonode.get('scenekeys'):
+        geonode['scenekeys'] = {}
+    geonode['scenekeys'][str(frame)] = livi_cache.scenekey(radtext, geonode.get('meshkeys', []))
+    # Reruns after an octree error rebuild the octree rather than fetch the one that failed
+    if not kwargs.get('pause') and livi_cache.fetch(geonode, octkey, '.oct', "{}-{}.oct".format(geonode.filebase, frame)):
+        export_op.report({'INFO'},"Export is finished")
+        return
+    if kwargs.get('mo') and geonode.get('genstatic') and genoct(geonode, frame, geonode['genstatic'] + skytext, geonode['genmod']):
+        export_op.report({'INFO'},"Export is finished")
+        return
     
 #    This next line allows the radiance scene description to be piped into the oconv command.
 #   oconvcmd = "oconv -w - > {0}-{1}.oct".format(geonode.filebase, frame).communicate(input = radtext.encode('utf-8'))
     ti.sleep(pt)
     oconvrun = Popen(oconvcmd, shell = True, stdin = PIPE, stdout=PIPE, stderr=STDOUT)#.communicate(input = radtext.encode('utf-8'))
 
+    octerr = 0
     for line in oconvrun.stdout:
         if 'incompatible' in line.decode():
             export_op.report({'ERROR'}, line.decode() + " Try increasing the sleep period in ti.sleep in the livi_export.py file")
+            octerr = 1
     ti.sleep(pt)
+    if not octerr:
+        livi_cache.store(geonode, octkey, '.oct', "{}-{}.oct".format(geonode.filebase, frame))
     export_op.report({'INFO'},"Export is finished")
 
+def genpath(path, gendir):
+    # Files of concurrently evaluated generative candidates go to the candidate's own directory
+    return(os.path.join(gendir, os.path.basename(path)) if gendir else path)
+
+def genoct(geonode, frame, stattext, modtext):
+    # Generative step octree: the modified geometry is added to an octree of the unmodified scene, which is
+    # only rebuilt when the unmodified scene changes. Returns 0 if oconv fails, e.g. when the modified
+    # geometry leaves the bounds of the base octree, so that a full oconv can be run instead. Octrees made
+    # with oconv -i refer to the unmodified scene file by name, so it and the base are named by their
+    # content and are never overwritten with a different scene.
+    basekey = livi_cache.textkey('genbase', stattext)
+    statfile, basefile = "{}-genstatic-{}.rad".format(geonode.filebase, basekey), "{}-genbase-{}.oct".format(geonode.filebase, basekey)
+    if not os.path.isfile(basefile):
+        with open(statfile, 'w') as statrad:
+            statrad.write(stattext)
+        if Popen("oconv -w {} > {}".format(statfile, basefile), shell = True, stdout = PIPE, stderr = PIPE).communicate()[1]:
+            if os.path.isfile(basefile):
+                os.remove(basefile)
+            return(0)
+    with open(geonode.filebase+"-{}-mod.rad".format(frame), 'w') as modfile:
+        modfile.write(modtext)
+    octerr = Popen("oconv -w -i {1} {0}-{2}-mod.rad > {0}-{2}.oct".format(geonode.filebase, basefile, frame), shell = True, stdout = PIPE, stderr = PIPE).communicate()[1]
+    if octerr:
+        print(octerr.decode())
+        return(0)
+    return(1)
+
 def cyfc1(self):
     scene = bpy.context.scene
     if 'LiVi' in scene.resnode or 'Shadow' in scene.resnode:
@@ -0,0 +1,218 @@
+import os, sys, threading, queue, signal
+from subprocess import PIPE, Popen, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+try:
+    from subprocess import CREATE_NEW_PROCESS_GROUP
+except ImportError:
+    CREATE_NEW_PROCESS_GROUP = 0x00000200
+
+def framejobs(nproc, njobs):
+    # Split the available cores between concurrent jobs: (number of workers, rtrace -n per job)
+    workers = max(1, min(int(nproc), njobs))
+    return(workers, max(1, int(nproc)//workers))
+
+def forks():
+    # rtrace and rcontrib only run several processes with -n where they can fork
+    return(sys.platform != 'win32')
+
+def pointjobs(nproc, njobs):
+    # As framejobs with the number of sensor point chunks per job: (workers, -n per process, chunks).
+    # Without -n support the cores left for each job are used by separate processes on chunks of the points.
+    workers, n = framejobs(nproc, njobs)
+    return((workers, n, 1) if forks() or n == 1 else (workers * n, 1, n))
+
+def splitpoints(ptsfile, nchunks):
+    # Balanced consecutive chunks of a sensor point file, written next to it. Returns the chunk file names.
+    if nchunks == 1:
+        return([ptsfile])
+    with open(ptsfile, 'r') as pts:
+        lines = pts.readlines()
+    chunkfiles, size = [], -(-len(lines)//nchunks)
+    for c in range(nchunks):
+        chunkfiles.append('{0[0]}-part{1}{0[1]}'.format(os.path.splitext(ptsfile), c))
+        with open(chunkfiles[-1], 'w') as chunk:
+            chunk.writelines(lines[c * size:(c + 1) * size])
+    return(chunkfiles)
+
+def joinjobs(results, nchunks):
+    # Stitch the outputs of consecutive chunk jobs back into one result per job in point order
+    return([(b''.join([r[0] for r in results[j:j + nchunks]]), ''.join([r[1] for r in results[j:j + nchunks]])) for j in range(0, len(results), nchunks)])
+
+def runjob(cmd, cwd = None):
+    # Returns raw stdout bytes and decoded stderr so that binary output is not mixed with messages
+    out, err = Popen(cmd, shell = True, stdout=PIPE, stderr=PIPE, cwd = cwd).communicate()
+    return((out, err.decode()))
+
+def runjobs(cmds, workers, label = 'Radiance', cwds = None):
+    results = [(b'', '')] * len(cmds)
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        jobs = {pool.submit(runjob, cmd, cwds[c] if cwds else None): c for c, cmd in enumerate(cmds)}
+        for j, job in enumerate(as_completed(jobs)):
+            results[jobs[job]] = job.result()
+            print('{}: job {} of {} complete'.format(label, j + 1, len(cmds)))
+    return(results)
+
+def groupargs():
+    # Popen arguments that start a process in its own process group, so that stoptree can end it and anything it starts
+    return({'creationflags': CREATE_NEW_PROCESS_GROUP} if sys.platform == 'win32' else {'start_new_session': True})
+
+def stoptree(proc):
+    # End a process started with groupargs together with its whole process tree
+    if proc.poll() is not None:
+        return
+    if sys.platform == 'win32':
+        Popen("taskkill /F /T /PID {}".format(proc.pid), shell = True, stdout = PIPE, stderr = PIPE).communicate()
+    else:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            proc.terminate()
+    try:
+        proc.wait(timeout = 5)
+    except TimeoutExpired:
+        proc.kill()
+
+def raderror(result):
+    return('octree' in result[1] or 'mesh' in result[1])
+
+def binmode(simalg):
+    # Binary float transport needs numpy and an rcalc stage that can be switched to binary i/o
+    return(np == 1 and 'rcalc' in simalg)
+
+def simweights(simalg):
+    # The RGB weights and offset of a linear rcalc result stage, found by passing unit values through it.
+    # None if the stage gives more than one value or is not linear in RGB.
+    if 'rcalc' not in simalg:
+        return(None)
+    probe = ((0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (0.5, 2, 4))
+    out = Popen(simalg.strip().lstrip('|'), shell = True, stdin = PIPE, stdout = PIPE, stderr = PIPE).communicate(input = ''.join(['{} {} {}\n'.format(*p) for p in probe]).encode())[0]
+    try:
+        vals = [float(v) for v in out.split()]
+    except ValueError:
+        return(None)
+    if len(vals) != len(probe):
+        return(None)
+    weights = [v - vals[0] for v in vals[1:4]]
+    if abs(sum([w * p for w, p in zip(weights, probe[4])]) + vals[0] - vals[4]) > 1e-4 * max(1, abs(vals[4])):
+        return(None)
+    return(weights, vals[0])
+
+def rtformat(simalg):
+    return(('a', simalg), ('f', simalg.replace('rcalc', 'rcalc -if3 -of', 1)))[binmode(simalg)]
+
+def resvals(out, binary):
+    # Binary values are widened to float64, whose elements are Python floats like those of the text path
+    if binary:
+        return(numpy.frombuffer(out, dtype = numpy.float32).astype(float))
+    else:
+        return([float(line) for line in out.decode().splitlines() if line.strip()])
+
+def rcvals(out, ncols, binary):
+    if binary:
+        return(numpy.frombuffer(out, dtype = numpy.float32).reshape(-1, ncols))
+    else:
+        return([[float(ld) for ld in line.split()] for line in out.decode().splitlines() if line.strip()])
+
+class RtraceSession(object):
+    # A running rtrace for one octree and parameter set. Each batch of points is written to stdin followed
+    # by a ray with a zero direction, which makes rtrace flush and output one null record, so results can
+    # be read back batch by batch without restarting rtrace and reloading the octree. A batch waits at most
+    # timeout seconds for more output.
+    def __init__(self, octree, params, simalg, nproc = 1, cwd = None, timeout = 3600):
+        self.key = (octree, os.path.getmtime(os.path.join(cwd or '', octree)), params, simalg, nproc)
+        fmt, alg = rtformat(simalg)
+        self.binary, self.timeout = fmt == 'f', timeout
+        self.proc = Popen("rtrace -n {} -w {} -fa{} -h -ov -I {} {}".format(nproc, params, fmt, octree, alg.replace('rcalc', 'rcalc -u', 1)),
+                          shell = True, stdin = PIPE, stdout = PIPE, stderr = PIPE, cwd = cwd, **groupargs())
+        # Output and warnings are collected on threads so that reads can time out and a full stderr pipe
+        # cannot stall rtrace. An empty chunk marks the end of the output.
+        self.errlines, self.outq = [], queue.Queue()
+        threading.Thread(target = self.readerr, daemon = True).start()
+        threading.Thread(target = self.readout, daemon = True).start()
+
+    def readerr(self):
+        for line in self.proc.stderr:
+            self.errlines.append(line.decode(errors = 'replace'))
+
+    def readout(self):
+        for chunk in iter(lambda: self.proc.stdout.read1(1 << 16), b''):
+            self.outq.put(chunk)
+        self.outq.put(b'')
+
+    def errors(self):
+        return(''.join(self.errlines))
+
+    def alive(self):
+        return(self.proc.poll() is None)
+
+    def raw(self, points):
+        # Output bytes for points given as rtrace input text or as rows of x y z dx dy dz. Returns
+        # None if rtrace has stopped, e.g. because of an octree error, timed out or gave a different
+        # number of records than points plus the null record.
+        text = points if isinstance(points, str) else ''.join(['{0[0]} {0[1]} {0[2]} {0[3]} {0[4]} {0[5]}\n'.format(p) for p in points])
+        npoints = text.count('\n')
+        # Input is written on a thread as rtrace output has to be read while a large batch is going in
+        writer = threading.Thread(target = self.write, args = ((text + '0 0 0 0 0 0\n').encode(),))
+        writer.start()
+        # Records are 4 byte floats in binary mode and lines in text mode
+        chunks, count, need = [], 0, (npoints + 1) * (1, 4)[self.binary]
+        while count < need:
+            try:
+                chunk = self.outq.get(timeout = self.timeout)
+            except queue.Empty:
+                chunk = b''
+            if not chunk:
+                break
+            chunks.append(chunk)
+            count += len(chunk) if self.binary else chunk.count(b'\n')
+        out = b''.join(chunks)
+        if count != need or not (self.binary or out.endswith(b'\n')):
+            self.stop()
+            writer.join()
+            return(None)
+        writer.join()
+        return(out[:-4] if self.binary else out[:out.rfind(b'\n', 0, len(out) - 1) + 1])
+
+    def write(self, data):
+        try:
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def trace(self, points):
+        out = self.raw(points)
+        return(resvals(out, self.binary) if out is not None else None)
+
+    def stop(self):
+        # Sessions whose output can no longer be matched to their input are ended with the rtrace and rcalc
+        # processes under the shell, which also ends a writer blocked on a full stdin pipe
+        stoptree(self.proc)
+
+    def close(self):
+        if self.alive():
+            self.proc.stdin.close()
+            self.proc.wait()
+
+sessions = {}
+
+def rtsession(slot, octree, params, simalg, nproc = 1, cwd = None):
+    # The session of a slot, e.g. a geometry node, restarted when the octree file, parameters or result
+    # algorithm have changed since it was started
+    session = sessions.get(slot)
+    if not session or not session.alive() or session.key != (octree, os.path.getmtime(os.path.join(cwd or '', octree)), params, simalg, nproc):
+        if session:
+            session.close()
+        session = sessions[slot] = RtraceSession(octree, params, simalg, nproc, cwd)
+    return(session)
+
+def closesessions():
+    for slot in list(sessions):
+        sessions.pop(slot).close()
@@ -0,0 +1,54 @@
+import os
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+# Binary store for per frame sensor results. Each object's results for a frame are saved as a float32
+# .npy file in a results folder of the export directory. The object only keeps a small manifest,
+# {'dir': folder, result name: {frame: file name}}, under 'resstore' and arrays are read memory mapped
+# when they are needed. Without numpy, or for results with no export directory (geonode None), they stay
+# in the object's ID properties as before and any manifest entry for them is dropped.
+
+def storedir(geonode):
+    sdir = os.path.join(geonode.newdir, 'results')
+    if not os.path.isdir(sdir):
+        os.makedirs(sdir)
+    return(sdir)
+
+def clear(ob, name):
+    if ob.get(name) is not None:
+        del ob[name]
+    if ob.get('resstore') and name in ob['resstore']:
+        del ob['resstore'][name]
+
+def write(geonode, ob, name, frame, vals):
+    if np == 1 and geonode:
+        sdir = storedir(geonode)
+        fname = '{}-{}-{}.npy'.format(ob.name.replace(' ', '_'), name, frame)
+        numpy.save(os.path.join(sdir, fname), numpy.asarray(vals, dtype = numpy.float32))
+        if not ob.get('resstore') or ob['resstore'].get('dir') != sdir:
+            ob['resstore'] = {'dir': sdir}
+        if name not in ob['resstore']:
+            ob['resstore'][name] = {}
+        ob['resstore'][name][str(frame)] = fname
+    else:
+        if ob.get('resstore') and name in ob['resstore']:
+            del ob['resstore'][name]
+        if ob.get(name) is None:
+            ob[name] = {}
+        ob[name][str(frame)] = list(vals)
+
+def read(ob, name, frame):
+    # A frame's results as a read only memory mapped array or, for results kept in the object, a list.
+    # Returns None if the object has no results for the frame.
+    store = ob.get('resstore')
+    if np == 1 and store and name in store and str(frame) in store[name]:
+        path = os.path.join(store['dir'], store[name][str(frame)])
+        if os.path.isfile(path):
+            return(numpy.load(path, mmap_mode = 'r'))
+    if ob.get(name) and str(frame) in ob[name]:
+        return(ob[name][str(frame)])
+    return(None)
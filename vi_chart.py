@@ -1,4 +1,5 @@
 import sys
+from .envi_eso import resseries
 
 try:
     import matplotlib.pyplot as plt
@@ -30,7 +31,7 @@ def timedata(datastring, timetype, stattype, months, days, dos, dnode, si, ei, S
         if timetype == '1':
             res = [[] for d in range(dnode['Start'], dnode['End']+1)]
             for h, val in enumerate([float(val) for val in datastring]):
-                res[int(dos[1:][si+h]) - dnode['Start']].append(val)
+                res[int(dos[si+h]) - dnode['Start']].append(val)
 
         elif timetype == '2':
             res = [[] for m in range(Sdate.month, Edate.month + 1)]
@@ -40,10 +41,9 @@ def timedata(datastring, timetype, stattype, months, days, dos, dnode, si, ei, S
 
 def chart_disp(chart_op, dnode, rnodes, Sdate, Edate):
     rn = dnode.inputs['X-axis'].links[0].from_node
-    rd = rn['resdict']
     sm, sd, sh, em, ed, eh = Sdate.month, Sdate.day, Sdate.hour, Edate.month, Edate.day, Edate.hour
-    (dm, dd, dh) = ([int(x) for x in rd['Month']], [int(x) for x in rd['Day']], [int(x) for x in rd['Hour']])
-    for i in range(len(rd['Hour'])):
+    (dm, dd, dh) = ([int(x) for x in resseries(rn, 'Month', 0)], [int(x) for x in resseries(rn, 'Day', 0)], [int(x) for x in resseries(rn, 'Hour', 0)])
+    for i in range(len(dh)):
         if sm == dm[i] and sd == dd[i] and sh == dh[i] - 1:
             si = i
         elif em == dm[i] and ed == dd[i] and eh == dh[i] - 1:
@@ -64,34 +64,34 @@ def chart_disp(chart_op, dnode, rnodes, Sdate, Edate):
             rn['resdict'][rd]
             if dnode.inputs['X-axis'].rtypemenu == 'Climate':
                 if dnode.inputs['X-axis'].links[0].from_node['resdict'][rd][0:2] == [dnode.inputs['X-axis'].rtypemenu, dnode.inputs['X-axis'].climmenu]:
-                    xdata = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['X-axis'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    xdata = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['X-axis'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     xlabel = label('Climate', dnode.inputs['X-axis'].statmenu, dnode.timemenu, dnode.inputs['X-axis'].climmenu)
             elif dnode.inputs['X-axis'].rtypemenu == 'Zone':
                 if (dnode.inputs['X-axis'].rtypemenu, dnode.inputs['X-axis'].links[0].from_node['resdict'][rd][0:2]) == ('Zone',[dnode.inputs['X-axis'].zonemenu, dnode.inputs['X-axis'].zonermenu]):
-                    xdata = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['X-axis'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    xdata = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['X-axis'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     xlabel = label('Zone', dnode.inputs['X-axis'].statmenu, dnode.timemenu, dnode.inputs['X-axis'].zonermenu)
             elif dnode.inputs['X-axis'].rtypemenu == 'Linkage':
                 if (dnode.inputs['X-axis'].rtypemenu, dnode.inputs['X-axis'].links[0].from_node['resdict'][rd][0:2]) == ('Linkage',[dnode.inputs['X-axis'].linkmenu, dnode.inputs['X-axis'].linkrmenu]):
-                    xdata = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['X-axis'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    xdata = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['X-axis'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     xlabel = label('Linkage', dnode.inputs['X-axis'].statmenu, dnode.timemenu, dnode.inputs['X-axis'].linkrmenu)
     
     rn = dnode.inputs['Y-axis 1'].links[0].from_node
     for rd in rn['resdict']:
         if dnode.inputs['Y-axis 1'].rtypemenu == 'Climate':
             if rn['resdict'][rd][0:2] == [dnode.inputs['Y-axis 1'].rtypemenu, dnode.inputs['Y-axis 1'].climmenu]:
-                y1data = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate) 
+                y1data = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate) 
                 ylabel = label('Climate', dnode.inputs['Y-axis 1'].statmenu, dnode.timemenu, dnode.inputs['Y-axis 1'].climmenu)
                 line, =plt.plot(xdata, y1data, color='k', label='Ambient ' + (" ("+dnode.inputs['Y-axis 1'].statmenu + ")", "")[dnode.timemenu == '0'])    
 
         elif dnode.inputs['Y-axis 1'].rtypemenu == 'Zone':
             if (dnode.inputs['Y-axis 1'].rtypemenu, rn['resdict'][rd][0:2]) == ('Zone', [dnode.inputs['Y-axis 1'].zonemenu, dnode.inputs['Y-axis 1'].zonermenu]):
-                y1data = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                y1data = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                 ylabel = label('Zone', dnode.inputs['Y-axis 1'].statmenu, dnode.timemenu, dnode.inputs['Y-axis 1'].zonermenu)
                 line, =plt.plot(xdata, y1data, color='k', label=rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 1'].statmenu + ")", "")[dnode.timemenu == '0'])
 
         elif dnode.inputs['Y-axis 1'].rtypemenu == 'Linkage':
             if (dnode.inputs['Y-axis 1'].rtypemenu, rn['resdict'][rd][0:2]) == ('Linkage', [dnode.inputs['Y-axis 1'].linkmenu, dnode.inputs['Y-axis 1'].linkrmenu]):
-                y1data = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                y1data = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 1'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                 ylabel = label('Linkage', dnode.inputs['Y-axis 1'].statmenu, dnode.timemenu, dnode.inputs['Y-axis 1'].linkrmenu)
                 line, =plt.plot(xdata, y1data, color='k', label=rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 1'].statmenu + ")", "")[dnode.timemenu == '0']) 
     
@@ -100,15 +100,15 @@ def chart_disp(chart_op, dnode, rnodes, Sdate, Edate):
         for rd in rn['resdict']:
             if dnode.inputs['Y-axis 2'].rtypemenu == 'Climate':
                 if dnode.inputs['Y-axis 2'].links[0].from_node['resdict'][rd][0:2] == [dnode.inputs['Y-axis 2'].rtypemenu, dnode.inputs['Y-axis 2'].climmenu]:
-                    y2data, ylabel = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate), rn['resdict'][rd][1]
+                    y2data, ylabel = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate), rn['resdict'][rd][1]
                     line, = plt.plot(xdata, y2data, linestyle = '--', color = '0.75', label = 'Ambient ' + (" ("+dnode.inputs['Y-axis 2'].statmenu + ")", "")[dnode.timemenu == '0'])
             elif dnode.inputs['Y-axis 2'].rtypemenu == 'Zone':
                 if (dnode.inputs['Y-axis 2'].rtypemenu, rn['resdict'][rd][0:2]) == ('Zone', [dnode.inputs['Y-axis 2'].zonemenu, dnode.inputs['Y-axis 2'].zonermenu]):
-                    y2data = timedata(rn['resdict'][rd][si+3:ei+4], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    y2data = timedata(resseries(rn, rd, 2)[si+1:ei+2], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     line, = plt.plot(xdata, y2data, color = '0.75', linestyle = '--', label = rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 2'].statmenu + ")", "")[dnode.timemenu == '0'])
             elif dnode.inputs['Y-axis 2'].rtypemenu == 'Linkage':
                 if (dnode.inputs['Y-axis 2'].rtypemenu, rn['resdict'][rd][0:2]) == ('Linkage', [dnode.inputs['Y-axis 2'].linkmenu, dnode.inputs['Y-axis 2'].linkrmenu]):
-                    y1data = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    y1data = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 2'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     line, = plt.plot(xdata, y1data, color='k', label=rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 2'].statmenu + ")", "")[dnode.timemenu == '0'])
     
     
@@ -117,15 +117,15 @@ def chart_disp(chart_op, dnode, rnodes, Sdate, Edate):
         for rd in rn['resdict']:
             if dnode.inputs['Y-axis 3'].rtypemenu == 'Climate':
                 if rn['resdict'][rd][0:2] == [dnode.inputs['Y-axis 3'].rtypemenu, dnode.inputs['Y-axis 3'].climmenu]:
-                    y3data, ylabel = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'],rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate), rn['resdict'][rd][1]
+                    y3data, ylabel = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate), rn['resdict'][rd][1]
                     line, = plt.plot(xdata, y3data, linestyle = ':', color = '0.5',label = 'Ambient ' + (" ("+dnode.inputs['Y-axis 3'].statmenu + ")", "")[dnode.timemenu == '0'])
             elif dnode.inputs['Y-axis 3'].rtypemenu == 'Zone':
                 if (dnode.inputs['Y-axis 3'].rtypemenu, rn['resdict'][rd][0:2]) == ('Zone', [dnode.inputs['Y-axis 3'].zonemenu, dnode.inputs['Y-axis 3'].zonermenu]):
-                    y3data = timedata(rn['resdict'][rd][si+3:ei+4], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'],rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    y3data = timedata(resseries(rn, rd, 2)[si+1:ei+2], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     line, = plt.plot(xdata, y3data, linestyle = ':', color = '0.5',label = rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 3'].statmenu + ")", "")[dnode.timemenu == '0'])
             elif dnode.inputs['Y-axis 3'].rtypemenu == 'Linkage':
                 if (dnode.inputs['Y-axis 3'].rtypemenu, rn['resdict'][rd][0:2]) == ('Linkage', [dnode.inputs['Y-axis 3'].linkmenu, dnode.inputs['Y-axis 3'].linkrmenu]):
-                    y1data = timedata(rn['resdict'][rd][si+2:ei+3], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, rn['resdict']['Month'], rn['resdict']['Day'], rn['resdict'][rn['dos']], dnode, si, ei, Sdate, Edate)
+                    y1data = timedata(resseries(rn, rd, 2)[si:ei+1], dnode.timemenu, dnode.inputs['Y-axis 3'].statmenu, resseries(rn, 'Month', 0), resseries(rn, 'Day', 0), resseries(rn, rn['dos'], 1), dnode, si, ei, Sdate, Edate)
                     line, =plt.plot(xdata, y1data, color='k', label=rn['resdict'][rd][0] + (" ("+dnode.inputs['Y-axis 3'].statmenu + ")", "")[dnode.timemenu == '0'])
     
     plt.xlabel(xlabel)    
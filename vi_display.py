@@ -26,6 +26,10 @@ except:
 
 from . import livi_export
 from . import vi_func
+from . import livi_store
+
+# Result labels drawn by linumdisplay keyed by object name: (frame/view key, [(label, position)])
+labelcache = {}
 
 def ss_display():
     pass
@@ -34,7 +38,8 @@ def li_display(simnode, connode, geonode):
     cp = '0' if not geonode else geonode.cpoint
     scene = bpy.context.scene
     vi_func.clearscene(scene, '@')
-    obreslist = []
+    labelcache.clear()
+    obreslist, obgeolist = [], []
     obcalclist = []
 
     for geo in scene.objects:
@@ -85,9 +90,10 @@ def li_display(simnode, connode, geonode):
                 f.select = True
             scene.objects[0].name = geo.name+"res"
             obreslist.append(scene.objects[0])
+            obgeolist.append(geo)
             scene.objects[0].lires = 1
             
-        for obres in obreslist:
+        for geo, obres in zip(obgeolist, obreslist):
             vi_func.selobj(scene, obres)
             if cp == '0' or not geonode:
                 if len(obres.data.polygons) > 1:
@@ -96,6 +102,7 @@ def li_display(simnode, connode, geonode):
                     bpy.ops.mesh.extrude_faces_move()
                     bpy.ops.object.mode_set(mode = 'OBJECT')
                     bpy.ops.object.select_all(action = 'DESELECT')
+            obres['cfaces'] = copyfaces(geo, obres)
 
             bpy.ops.object.shape_key_add(from_mix = False)
 
@@ -130,6 +137,66 @@ def spnumdisplay(disp_op, context, simnode):
     else:
         return
 
+def copyfaces(geo, obres):
+    # The calculation faces of an object as indices in its separated result copy, matched by face centre
+    # among the copy's selected faces, so that extruded 3D faces are found too. Unmatched faces give -1.
+    centres = {tuple([round(c, 4) for c in f.center]): f.index for f in obres.data.polygons if f.select}
+    return([centres.get(tuple([round(c, 4) for c in geo.data.polygons[int(cf)].center]), -1) for cf in geo['cfaces']])
+
+def livalues(ob, frame, cp):
+    # Exact result values keyed by face or vertex index when the stored results match the mesh
+    reslist = livi_store.read(ob, 'oreslist', frame)
+    ids = ob.get('cfaces') if cp == '0' else ob.get('cverts')
+    return(dict(zip(ids, reslist)) if reslist is not None and ids and len(reslist) == len(ids) else {})
+
+def lilabels(context, ob, simnode, geonode, cp, fn, obresnum, view_mat):
+    # Result labels and their view space positions for one object, frame and view
+    scene, obm, ob_mat, labels = context.scene, ob.data, ob.matrix_world, []
+    view_pos = [vmi*scene['cs'] * 2 for vmi in (view_mat.inverted()[0][3], view_mat.inverted()[1][3], view_mat.inverted()[2][3])]
+    vals = livalues(ob, scene.frame_current, cp if geonode else '0')
+    maxval, minval = max(simnode['maxres']), min(simnode['minres'])
+
+    if cp == "0" or not geonode:
+        faces = [f for f in ob.data.polygons if f.select == True] if ob.lires else [f for f in ob.data.polygons if ob.data.materials[f.material_index].vi_shadow] if simnode.bl_label == 'VI Shadow Study' else [f for f in ob.data.polygons if f.select == True] if ob.lires else [f for f in ob.data.polygons if ob.data.materials[f.material_index].livi_sense]
+        if scene.vi_display_vis_only:
+            faces = [f for f in faces if not scene.ray_cast(ob_mat*((vi_func.face_centre(ob, obresnum, f)))+ 0.01*(ob_mat*f.normal-ob.location), view_pos)[0]]
+    else:
+        fverts = set(sum([list(f.vertices[:]) for f in ob.data.polygons if f.select], []))
+        verts = [ob.data.vertices[v] for v in fverts if not scene.ray_cast(ob_mat*vi_func.v_pos(ob, v) + 0.01*ob_mat*ob.data.vertices[v].normal,view_pos)[0]] if scene.vi_display_vis_only else [ob.data.vertices[v] for v in fverts] 
+        loops = []
+        for v in verts:
+            for f in [f for f in ob.data.polygons if f.select == True]:
+                if v.index in f.vertices:
+                    loops.append(f.loop_indices[list(f.vertices).index(v.index)])
+                    break
+
+    total_mat = view_mat*ob_mat
+    if cp == "0" or not geonode:            
+        for f in faces:
+            vsum = mathutils.Vector((0, 0, 0))
+            for v in f.vertices:
+                vsum = ob.active_shape_key.data[v].co + vsum if obresnum > 0 else ob.data.vertices[v].co + vsum
+            fc = vsum/len(f.vertices)
+            if not f.hide:
+                loop_index = f.loop_indices[0]
+                if len(set(obm.vertex_colors[fn].data[loop_index].color[:])) > 0:
+                    if (total_mat*fc)[2] > 0:
+                        col = obm.vertex_colors[fn].data[loop_index].color
+                        if geonode:
+                            val = vals[f.index] if f.index in vals else abs(minval + (1 - (1.333333*colorsys.rgb_to_hsv(*[col[i]/255 for i in range(3)])[0]))*(maxval - minval))
+                            labels.append((('{:.1f}', '{:.0f}')[val > 100].format(val), total_mat*fc.to_4d()))
+                        else:
+                            labels.append(('{:.0f}'.format(vals[f.index] if f.index in vals else abs(col[0]*100)), total_mat*fc.to_4d()))
+    elif cp == "1":
+        for v, vert in enumerate(verts):
+            vpos = ob.active_shape_key.data[vert.index].co if obresnum > 0 else vert.co
+            if len(set(obm.vertex_colors[fn].data[vert.index].color[:])) > 0:
+                if (total_mat*vpos)[2] > 0:
+                    col = obm.vertex_colors[fn].data[loops[v]].color
+                    val = vals[vert.index] if vert.index in vals else abs(minval + int((1 - (1.333333*colorsys.rgb_to_hsv(col[0]/255, col[1]/255, col[2]/255)[0]))*(maxval - minval)))
+                    labels.append((('{:.1f}', '{:.0f}')[maxval > 100].format(val), total_mat*vpos.to_4d()))
+    return(labels)
+
 def linumdisplay(disp_op, context, simnode, connode, geonode):
     scene = context.scene
     if not scene.vi_display:
@@ -175,48 +242,12 @@ def linumdisplay(disp_op, context, simnode, connode, geonode):
     for ob in obd:
         if ob.active_shape_key_index != fn+1:
             ob.active_shape_key_index = fn+1
-        obm = ob.data
-        ob_mat = ob.matrix_world
         view_mat = context.space_data.region_3d.perspective_matrix
-        view_pos = [vmi*scene['cs'] * 2 for vmi in (view_mat.inverted()[0][3], view_mat.inverted()[1][3], view_mat.inverted()[2][3])]
-
-        if cp == "0" or not geonode:
-            faces = [f for f in ob.data.polygons if f.select == True] if ob.lires else [f for f in ob.data.polygons if ob.data.materials[f.material_index].vi_shadow] if simnode.bl_label == 'VI Shadow Study' else [f for f in ob.data.polygons if f.select == True] if ob.lires else [f for f in ob.data.polygons if ob.data.materials[f.material_index].livi_sense]
-            if scene.vi_display_vis_only:
-                faces = [f for f in faces if not scene.ray_cast(ob_mat*((vi_func.face_centre(ob, len(obreslist), f)))+ 0.01*(ob_mat*f.normal-ob.location), view_pos)[0]]
-        else:
-            fverts = set(sum([list(f.vertices[:]) for f in ob.data.polygons if f.select], []))
-            verts = [ob.data.vertices[v] for v in fverts if not scene.ray_cast(ob_mat*vi_func.v_pos(ob, v) + 0.01*ob_mat*ob.data.vertices[v].normal,view_pos)[0]] if scene.vi_display_vis_only else [ob.data.vertices[v] for v in fverts] 
-            loops = []
-            for v in verts:
-                for f in [f for f in ob.data.polygons if f.select == True]:
-                    if v.index in f.vertices:
-                        loops.append(f.loop_indices[list(f.vertices).index(v.index)])
-                        break
-
-        total_mat = view_mat*ob_mat
-        if cp == "0" or not geonode:            
-            for f in faces:
-                vsum = mathutils.Vector((0, 0, 0))
-                for v in f.vertices:
-                    vsum = ob.active_shape_key.data[v].co + vsum if len(obreslist) > 0 else ob.data.vertices[v].co + vsum
-                fc = vsum/len(f.vertices)
-                if not f.hide:
-                    loop_index = f.loop_indices[0]
-                    if len(set(obm.vertex_colors[fn].data[loop_index].color[:])) > 0:
-                        if (total_mat*fc)[2] > 0:
-                            col, maxval, minval = obm.vertex_colors[fn].data[loop_index].color, max(simnode['maxres']), min(simnode['minres'])
-                            if geonode:
-                                val = abs(min(simnode['minres']) + (1 - (1.333333*colorsys.rgb_to_hsv(*[col[i]/255 for i in range(3)])[0]))*(maxval - minval))
-                                vi_func.draw_index(context, scene.vi_leg_display, mid_x, mid_y, width, height, ('{:.1f}', '{:.0f}')[val > 100].format(val), total_mat*fc.to_4d())
-                            else:
-                                vi_func.draw_index(context, scene.vi_leg_display, mid_x, mid_y, width, height, '{:.0f}'.format(abs(col[0]*100)), total_mat*fc.to_4d())
-        elif cp == "1":
-            for v, vert in enumerate(verts):
-                vpos = ob.active_shape_key.data[vert.index].co if len(obreslist) > 0 else vert.co
-                if len(set(obm.vertex_colors[fn].data[vert.index].color[:])) > 0:
-                    if (total_mat*vpos)[2] > 0:
-                        vi_func.draw_index(context, scene.vi_leg_display, mid_x, mid_y, width, height, ('{:.1f}', '{:.0f}')[max(simnode['maxres']) > 100].format(abs(min(simnode['minres']) + int((1 - (1.333333*colorsys.rgb_to_hsv(obm.vertex_colors[fn].data[loops[v]].color[0]/255, obm.vertex_colors[fn].data[loops[v]].color[1]/255, obm.vertex_colors[fn].data[loops[v]].color[2]/255)[0]))*(max(simnode['maxres']) - min(simnode['minres']))))), total_mat*vpos.to_4d())
+        labelkey = (scene.frame_current, cp, scene.vi_display_vis_only, scene.vi_disp_3d, scene.vi_disp_3dlevel, ob.active_shape_key_index, width, height, ob.data.total_face_sel, ob.data.total_vert_sel, tuple([tuple(row) for row in view_mat]), tuple([tuple(row) for row in ob.matrix_world]))
+        if labelcache.get(ob.name, ('', []))[0] != labelkey:
+            labelcache[ob.name] = (labelkey, lilabels(context, ob, simnode, geonode, cp, fn, len(obreslist), view_mat))
+        for label, vec in labelcache[ob.name][1]:
+            vi_func.draw_index(context, scene.vi_leg_display, mid_x, mid_y, width, height, label, vec)
     blf.disable(0, 4)
 
 def li3D_legend(self, context, simnode, connode, geonode):
@@ -1,5 +1,6 @@
 import bpy, os, sys, multiprocessing, mathutils, bmesh, datetime, colorsys, bgl, blf
 from math import sin, cos, asin, acos, pi
+from array import array
 from bpy.props import IntProperty, StringProperty, EnumProperty, FloatProperty, BoolProperty, FloatVectorProperty
 try:
     import matplotlib.pyplot as plt
@@ -8,6 +9,13 @@ try:
 except:
     mp = 0
 
+from . import envi_eso
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
 
 #from . import windrose
 dtdf = datetime.date.fromordinal
@@ -206,7 +214,6 @@ def clearscene(scene, op):
 
 def processf(pro_op, node):
     rtypes, ctypes, ztypes, zrtypes, ltypes, lrtypes = [], [], [], [], [], []
-    resfile = open(node.resfilename, 'r')
 
     envdict = {'Site Outdoor Air Drybulb Temperature [C] !Hourly': "Temperature ("+ u'\u00b0'+"C)",
                'Site Outdoor Air Relative Humidity [%] !Hourly': 'Humidity (%)',
@@ -222,53 +229,46 @@ def processf(pro_op, node):
                 'AFN Zone Infiltration Air Change Rate [ach] !Hourly': 'ACH'}
     lresdict = {'AFN Linkage Node 1 to Node 2 Volume Flow Rate [m3/s] !Hourly': 'Linkage Flow 1 to 2',
                 'AFN Surface Venting Window or Door Opening Factor [] !Hourly': 'Opening Factor'}
-    resdict = {}
-
     objlist = [obj.name.upper() for obj in bpy.data.objects if obj.envi_type == '1' and obj.layers[1] == True]
+    node['rtypes'] = ['Time']
 
-    for line in resfile.readlines():
-        linesplit = line.strip('\n').split(',')
-
-        if linesplit[0] in resdict:
-            resdict[linesplit[0]].append(linesplit[1])
-            if linesplit[0] == dos:
-                resdict['Month'].append(linesplit[2])
-                resdict['Day'].append(linesplit[3])
-                resdict['Hour'].append(linesplit[5])
-
-        elif len(linesplit) > 3 and linesplit[2] == 'Day of Simulation[]':
-            resdict[linesplit[0]] = ['Day of Simulation']
-            resdict['Month'] = []
-            resdict['Day'] = []
-            resdict['Hour'] = []
-            dos = linesplit[0]
-            node['rtypes'] = ['Time']
-
-        elif len(linesplit) > 3 and linesplit[2] == 'Environment':
+    def header(linesplit):
+        # Climate, zone and linkage results are kept with their result type headers
+        if linesplit[2] == 'Environment':
             if 'Climate' not in node['rtypes']:
-                node['rtypes']+= ['Climate']
-            resdict[linesplit[0]] = ['Climate', envdict[linesplit[3]]]
+                node['rtypes'] += ['Climate']
             ctypes.append(envdict[linesplit[3]])
+            return(['Climate', envdict[linesplit[3]]])
 
-        elif len(linesplit) > 3 and linesplit[2] in objlist:
+        elif linesplit[2] in objlist:
             if 'Zone' not in node['rtypes']:
                node['rtypes'] += ['Zone']
-            resdict[linesplit[0]] = [linesplit[2], zresdict[linesplit[3]]]
             if linesplit[2] not in ztypes:
                 ztypes.append(linesplit[2])
             if zresdict[linesplit[3]] not in zrtypes:
                 zrtypes.append(zresdict[linesplit[3]])
+            return([linesplit[2], zresdict[linesplit[3]]])
 
-        elif len(linesplit) > 3 and linesplit[3] in lresdict:
+        elif linesplit[3] in lresdict:
             if 'Linkage' not in node['rtypes']:
                node['rtypes'] += ['Linkage']
-            resdict[linesplit[0]] = [linesplit[2], lresdict[linesplit[3]]]
             if linesplit[2] not in ltypes:
                 ltypes.append(linesplit[2])
             if lresdict[linesplit[3]] not in lrtypes:
                 lrtypes.append(lresdict[linesplit[3]])
+            return([linesplit[2], lresdict[linesplit[3]]])
+
+    series, resdict, dos, dosrange = envi_eso.esoseries(node.resfilename, header)
 
-    resfile.close()
+    # Series values go to the columnar store when numpy is available and into the node otherwise
+    if np == 1:
+        node['resstore'] = envi_eso.writestore(node.resfilename, series, resdict, dosrange)
+    else:
+        # In the node the time columns have no header and their values follow directly
+        if node.get('resstore'):
+            del node['resstore']
+        for key in series:
+            resdict[key] = resdict.get(key, []) + list(series[key])
 #    node['rtypes'] = rtypes
     node['dos'] = dos
     node['resdict'] = resdict
@@ -277,8 +277,7 @@ def processf(pro_op, node):
     node['zrtypes'] = zrtypes
     node['ltypes'] = ltypes
     node['lrtypes'] = lrtypes
-    node.dsdoy = int(resdict[dos][1])
-    node.dedoy = int(resdict[dos][-1])
+    node.dsdoy, node.dedoy = int(dosrange[0]), int(dosrange[1])
 
 
 def iprop(iname, idesc, imin, imax, idef):
@@ -306,31 +305,42 @@ def nfprop(fname, fdesc, fmin, fmax, fdef):
 def nfvprop(fvname, fvattr, fvdef, fvsub):
     return(FloatVectorProperty(name=fvname, attr = fvattr, default = fvdef, subtype = fvsub, update = nodeexported))
 
-def boundpoly(obj, mat, poly):
+def boundpoly(obj, mat, poly, boundmatches):
     if mat.envi_boundary:
-        polyloc = obj.matrix_world*mathutils.Vector(poly.center)
-        for node in bpy.data.node_groups['EnVi Network'].nodes:
-            if hasattr(node, 'zone'):
-                if node.inputs[mat.name+'_b'].is_linked == True:
-                    bobj = bpy.data.objects[node.inputs[mat.name+'_b'].links[0].from_node.zone]
-                    for bpoly in bobj.data.polygons:
-                        bpolyloc = bobj.matrix_world*mathutils.Vector(bpoly.center)
-                        if bobj.data.materials[bpoly.material_index] == mat and max(bpolyloc - polyloc) < 0.001 and abs(bpoly.area - poly.area) < 0.01:
-                            return(("Surface", node.inputs[mat.name+'_b'].links[0].from_node.zone+'_'+str(bpoly.index), "NoSun", "NoWind"))
-
-                elif node.outputs[mat.name+'_b'].is_linked == True:
-                    bobj = bpy.data.objects[node.outputs[mat.name+'_b'].links[0].to_node.zone]
-                    for bpoly in bobj.data.polygons:
-                        bpolyloc = bobj.matrix_world*mathutils.Vector(bpoly.center)
-                        if bobj.data.materials[bpoly.material_index] == mat and max(bpolyloc - polyloc) < 0.001 and abs(bpoly.area - poly.area) < 0.01:
-                            return(("Surface", node.outputs[mat.name+'_b'].links[0].to_node.zone+'_'+str(bpoly.index), "NoSun", "NoWind"))
-            else:
-                return(("Outdoors", "", "SunExposed", "WindExposed"))
-        else:
-            return(("Outdoors", "", "SunExposed", "WindExposed"))
+        return(boundmatches.get((obj.name, poly.index), ("Outdoors", "", "SunExposed", "WindExposed")))
     else:
         return(("Outdoors", "", "SunExposed", "WindExposed"))
 
+def boundmatch(tol = 0.001):
+    # Outside boundary conditions of all linked boundary surfaces in the EnVi network, matched once per
+    # export. Polygons are hashed by material and world space centre quantised to the tolerance so each
+    # lookup only checks the neighbouring cells for an opposite facing polygon of a linked zone.
+    partners, cells, boundmatches = {}, {}, {}
+    for node in [node for node in bpy.data.node_groups['EnVi Network'].nodes if hasattr(node, 'zone')]:
+        for sock in [sock for sock in node.inputs if sock.bl_idname == 'EnViBoundSocket' and sock.is_linked]:
+            for zones in ((node.zone, sock.links[0].from_node.zone), (sock.links[0].from_node.zone, node.zone)):
+                partners.setdefault((zones[0], sock.name[:-2]), set()).add(zones[1])
+
+    polys = []
+    for zone in set([zm[0] for zm in partners]):
+        obj = bpy.data.objects[zone]
+        nmatrix = obj.matrix_world.to_3x3().inverted().transposed()
+        for poly in [poly for poly in obj.data.polygons if (zone, obj.data.materials[poly.material_index].name) in partners]:
+            centre = obj.matrix_world*mathutils.Vector(poly.center)
+            bpoly = (zone, obj.data.materials[poly.material_index].name, poly.index, centre, nmatrix*poly.normal, poly.area)
+            cells.setdefault((bpoly[1],) + tuple([int(round(c/tol)) for c in centre]), []).append(bpoly)
+            polys.append(bpoly)
+
+    for zone, matname, pindex, centre, normal, area in polys:
+        cell = [int(round(c/tol)) for c in centre]
+        for offset in [(x, y, z) for x in (0, -1, 1) for y in (0, -1, 1) for z in (0, -1, 1)]:
+            for bzone, bmatname, bindex, bcentre, bnormal, barea in cells.get((matname, cell[0] + offset[0], cell[1] + offset[1], cell[2] + offset[2]), []):
+                if bzone in partners[(zone, matname)] and max([abs(bc - c) for bc, c in zip(bcentre, centre)]) < tol and abs(barea - area) < 0.01 and normal.dot(bnormal) < 0:
+                    boundmatches[(zone, pindex)] = ("Surface", bzone+'_'+str(bindex), "NoSun", "NoWind")
+                    break
+            if (zone, pindex) in boundmatches:
+                break
+    return(boundmatches)
 
 def objvol(op, obj):
     bm = bmesh.new()
@@ -359,13 +369,14 @@ def objvol(op, obj):
 
 
 def ceilheight(obj, vertz):
+    # World space heights are found once per vertex rather than for every polygon corner reference
     mesh = obj.data
-    for vert in mesh.vertices:
-        vertz.append((obj.matrix_world * vert.co)[2])
+    vertz += [(obj.matrix_world * vert.co)[2] for vert in mesh.vertices]
     zmax = max(vertz)
     zmin = min(vertz)
-    ceiling = [max((obj.matrix_world * mesh.vertices[poly.vertices[0]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[1]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[2]].co)[2]) for poly in mesh.polygons if max((obj.matrix_world * mesh.vertices[poly.vertices[0]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[1]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[2]].co)[2]) > 0.9 * zmax]
-    floor = [min((obj.matrix_world * mesh.vertices[poly.vertices[0]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[1]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[2]].co)[2]) for poly in mesh.polygons if min((obj.matrix_world * mesh.vertices[poly.vertices[0]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[1]].co)[2], (obj.matrix_world * mesh.vertices[poly.vertices[2]].co)[2]) < zmin + 0.1 * (zmax - zmin)]
+    polyz = [[vertz[v] for v in poly.vertices[:3]] for poly in mesh.polygons]
+    ceiling = [max(pz) for pz in polyz if max(pz) > 0.9 * zmax]
+    floor = [min(pz) for pz in polyz if min(pz) < zmin + 0.1 * (zmax - zmin)]
     return(sum(ceiling)/len(ceiling)-sum(floor)/len(floor))
 
 
@@ -495,46 +506,50 @@ def drawfont(text, fi, lencrit, height, x1, y1):
     blf.position(fi, x1, height - y1 - lencrit*26, 0)
     blf.draw(fi, text)
 
-def mtx2vals(mtxlines, fwd, locnode):
-    if locnode:
-        records = (datetime.datetime(datetime.datetime.now().year, locnode.endmonth, 1) - datetime.datetime(datetime.datetime.now().year, locnode.startmonth, 1)).days*24
-    else:
-        for records, line in enumerate(mtxlines):
-            if line == '\n':
-                break
-    try:
-        import numpy
-        np = 1
-    except:
-        np = 0
-
-    vecvals = numpy.array([[x%24, (fwd+int(x/24))%7] + [0 for p in range(146)] for x in range(0,records)]) if np ==1 else [[x%24, (fwd+int(x/24))%7] + [0 for p in range(146)] for x in range(0,records)]
-    vals = numpy.zeros((146)) if np ==1 else [0 for x in range(146)]
-#    vals =  numpy.array([[0,1,2] for x in range(146)]) if np ==1 else [[0,1,2] for x in range(146)]
-
-    hour = 0
-    patch = 2
-    for fvals in mtxlines:
-        try:
-            sumvals = sum([float(lv) for lv in fvals.split(" ")])/3
-#            indvals = [float(lv) for lv in fvals.split(" ")]
-            if sumvals > 0:
-                vals[patch - 2] += sumvals
-#                for i, v in enumerate(vals[patch - 2]):
-#                    vals[patch - 2][i] += indvals[i]
-
-                vecvals[hour][patch] = sumvals
-            hour += 1
-        except:
-            if fvals != "\n":
-                hour += 1
-            else:
-                patch += 1
-                hour = 0
+def skypatches(mf):
+    # Tregenza (MF:1) or Reinhart MF:n sky patches including the ground patch
+    return(144 * mf * mf + 2)
+
+def skymf(npatches):
+    # The sky subdivision of a patch count, or 0 if it is not a Tregenza/Reinhart sky
+    return({skypatches(mf): mf for mf in range(1, 9)}.get(npatches, 0))
+
+def skybins(mf):
+    # rcontrib options binning sky_glow contributions into the patches of a sky subdivision
+    return("-f tregenza.cal -b tbin -bn 146" if mf == 1 else "-e MF:{} -f reinhart.cal -b rbin -bn {}".format(mf, skypatches(mf)))
+
+def mtx2vals(mtxlines, fwd, npatches = None):
+    # Hourly sky patch values from gendaymtx text read a line at a time. Patches are blocks of hourly
+    # RGB lines separated by blank lines and any Radiance header block is skipped. Returns rows of
+    # [hour, weekday, patch values] and the patch totals. The number of patches is that of the file
+    # unless npatches is given. With numpy the rows are a float32 array.
+    patches, patch, header = [], array('d'), 0
+    for l, line in enumerate(mtxlines):
+        if l == 0 and line.startswith('#?RADIANCE'):
+            header = 1
+        if header:
+            header = 1 if line.strip() else 0
+        elif line.strip():
+            rgb = line.split()
+            patch.append((float(rgb[0]) + float(rgb[1]) + float(rgb[2]))/3)
+        elif patch:
+            patches.append(patch)
+            patch = array('d')
+    if patch:
+        patches.append(patch)
+    records = len(patches[0]) if patches else 0
+    npatches = npatches or len(patches)
+    patches = [(patch + array('d', [0]) * records)[:records] for patch in (patches + [array('d')] * npatches)[:npatches]]
+
     if np == 1:
-        return(vecvals.tolist(), vals)
+        vecvals = numpy.empty((records, npatches + 2), dtype = numpy.float32)
+        hours = numpy.arange(records)
+        vecvals[:,0], vecvals[:,1] = hours%24, (fwd + hours//24)%7
+        for p, patch in enumerate(patches):
+            vecvals[:,p + 2] = numpy.frombuffer(patch, dtype = numpy.float64)
+        return(vecvals, vecvals[:,2:].sum(axis = 0, dtype = numpy.float64))
     else:
-        return(vecvals, vals)
+        return([[x%24, (fwd+int(x/24))%7] + [patch[x] for patch in patches] for x in range(records)], [sum(patch) for patch in patches])
 
 def framerange(scene, anim):
     if anim == 'Static':
@@ -663,6 +678,25 @@ def solarPosition(doy, lst, lat, lon):
     azimuth = radToDeg*phi
     return([altitude, azimuth, beta, phi])
 
+def solarPositions(doy, lst, lat, lon):
+    # Array version of solarPosition. doy and lst are broadcast against each other and the
+    # returned direction vectors point from the origin towards the sun.
+    doy, lst = numpy.asarray(doy, dtype = float), numpy.asarray(lst, dtype = float)
+    lsm = round(lon/15, 0)*15
+    b = 2*pi*(doy-81)/364
+    et = 9.87 * numpy.sin(2*b) - 7.53 * numpy.cos(b) - 1.5 * numpy.sin(b)
+    degToRad = 2*pi/360
+    radToDeg = 1/degToRad
+    ast = lst + et/60 + (lsm-lon)/15
+    delta = degToRad*23.45 * numpy.sin(2*pi*(284+doy)/365)
+    h = degToRad*15 * (ast-12)
+    l = degToRad*lat
+    beta = numpy.arcsin(numpy.clip(numpy.cos(l) * numpy.cos(delta) * numpy.cos(h) + numpy.sin(l) * numpy.sin(delta), -1, 1))
+    phi = numpy.arccos(numpy.clip((numpy.sin(beta) * numpy.sin(l) - numpy.sin(delta))/(numpy.cos(beta) * numpy.cos(l)), -1, 1))
+    phi = numpy.where((ast <= 12) | (ast >= 24), 2*pi - phi, phi)
+    direcs = numpy.stack((-numpy.cos(beta) * numpy.sin(phi), -numpy.cos(beta) * numpy.cos(phi), numpy.sin(beta)), axis = -1)
+    return([radToDeg*beta, radToDeg*phi, beta, phi, direcs])
+
 def set_legend(ax):
     l = ax.legend(borderaxespad = -4)
     plt.setp(l.get_texts(), fontsize=8)
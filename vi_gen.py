@@ -1,5 +1,5 @@
-import bpy, mathutils, math
-from . import vi_func
+import bpy, mathutils, math, os
+from . import vi_func, livi_store
 from .livi_export import radgexport
 
 try:
@@ -73,7 +73,7 @@ def vigen(calc_op, li_calc, resapply, geonode, connode, simnode, geogennode, tar
             ob.keyframe_insert(data_path='["licalc"]', frame = scene.frame_current + 1)
         else:
             ob.manip = 0
-        ob['licalc'] = vi_func.gentarget(tarnode, ob['oreslist']['{}'.format(scene.frame_current)])
+        ob['licalc'] = vi_func.gentarget(tarnode, livi_store.read(ob, 'oreslist', scene.frame_current))
     
     for ob in manipobs:
         if ob.manip == 1 and geogennode.geomenu == 'Mesh':  
@@ -103,29 +103,45 @@ def vigen(calc_op, li_calc, resapply, geonode, connode, simnode, geogennode, tar
                     bpy.ops.object.mode_set(mode = 'OBJECT')                            
                     ob['vgi'] = ob.vertex_groups['genexfaces'].index
                             
-        if scene.frame_current > scene.frame_start:              
-            for ob in manipobs:
-                ob.keyframe_insert(data_path='["licalc"]')
-                vi_func.selobj(scene, ob)  
-                if ob.manip == 1 and geogennode.geomenu == 'Mesh':
-                    bpy.ops.object.shape_key_add(from_mix = False)
-                    ob.active_shape_key.name = 'gen-' + str(scene.frame_current)
-                    modgeo(ob, geogennode, scene, scene.frame_current, scene.frame_start)   
-                    for shape in ob.data.shape_keys.key_blocks:
-                        if "Basis" not in shape.name:
-                            shape.value = 1 if shape.name == 'gen-{}'.format(scene.frame_current) else 0
-                            shape.keyframe_insert("value")                
-                elif ob.manip == 1 and geogennode.geomenu == 'Object':
-                    modgeo(ob, geogennode, scene, scene.frame_current, scene.frame_start)
-                    ob.keyframe_insert(('location', 'rotation_euler', 'scale')[int(geogennode.omanmenu)])
-                                        
-            radgexport(calc_op, geonode, genframe = scene.frame_current, mo = [ob for ob in manipobs if ob.manip == 1])
-            res.append(li_calc(calc_op, simnode, connode, geonode, vi_func.livisimacc(simnode, connode), genframe = scene.frame_current))
+        if scene.frame_current > scene.frame_start:
+            # Candidate steps are generated and exported in turn and then evaluated with concurrent rtrace jobs
+            fc = scene.frame_current
+            cands = list(range(fc, min(fc + geogennode.candidates, scene.frame_start + geogennode.steps + 1)))
+            for c in cands:
+                scene.frame_set(c)
+                for ob in manipobs:
+                    ob.keyframe_insert(data_path='["licalc"]')
+                    vi_func.selobj(scene, ob)  
+                    if ob.manip == 1 and geogennode.geomenu == 'Mesh':
+                        bpy.ops.object.shape_key_add(from_mix = False)
+                        ob.active_shape_key.name = 'gen-' + str(scene.frame_current)
+                        modgeo(ob, geogennode, scene, scene.frame_current, scene.frame_start)   
+                        for shape in ob.data.shape_keys.key_blocks:
+                            if "Basis" not in shape.name:
+                                shape.value = 1 if shape.name == 'gen-{}'.format(scene.frame_current) else 0
+                                shape.keyframe_insert("value")                
+                    elif ob.manip == 1 and geogennode.geomenu == 'Object':
+                        modgeo(ob, geogennode, scene, scene.frame_current, scene.frame_start)
+                        ob.keyframe_insert(('location', 'rotation_euler', 'scale')[int(geogennode.omanmenu)])
+                gendir = os.path.join(geonode.newdir, 'gen', str(c)) if len(cands) > 1 else ''
+                if gendir and not os.path.isdir(gendir):
+                    os.makedirs(gendir)
+                radgexport(calc_op, geonode, genframe = c, mo = [ob for ob in manipobs if ob.manip == 1], gendir = gendir)
+            cres = li_calc(calc_op, simnode, connode, geonode, vi_func.livisimacc(simnode, connode), genframe = fc, genframes = cands)
             
-            for ob in vi_func.retobjs('livic'):
-                ob['licalc'] = vi_func.gentarget(tarnode, ob['oreslist']['{}'.format(scene.frame_current)]) 
-                ob.keyframe_insert(data_path='["licalc"]', frame = scene.frame_current + 1)
-                ob.manip = ob['licalc'] if ob.manip == 1 else ob.manip
+            # Candidates are taken in order up to the first one at which gentarget changes the manipulated
+            # geometry or sensors. Later candidates assumed no change and are discarded.
+            for ci, c in enumerate(cands):
+                scene.frame_set(c)
+                res.append(cres[ci])
+                state = genstate(manipobs)
+                for ob in vi_func.retobjs('livic'):
+                    ob['licalc'] = vi_func.gentarget(tarnode, livi_store.read(ob, 'oreslist', scene.frame_current)) 
+                    ob.keyframe_insert(data_path='["licalc"]', frame = scene.frame_current + 1)
+                    ob.manip = ob['licalc'] if ob.manip == 1 else ob.manip
+                if c != cands[-1] and genstate(manipobs) != state:
+                    genrollback(scene, manipobs, geogennode, cands[ci + 1:])
+                    break
         
         scene.frame_end = scene.frame_current + 1                        
         scene.frame_set(scene.frame_current + 1)
@@ -148,6 +164,29 @@ def vigen(calc_op, li_calc, resapply, geonode, connode, simnode, geogennode, tar
     vi_func.vcframe('', scene, livicgeos, simnode['Animation'])            
     scene.frame_current = scene.frame_start       
         
+def genstate(manipobs):
+    return([ob.name for ob in vi_func.retobjs('livic')], [ob.manip for ob in manipobs])
+
+def genrollback(scene, manipobs, geogennode, frames):
+    # Remove the keyframes and shape keys of discarded candidate steps
+    for ob in manipobs:
+        for frame in frames:
+            try:
+                ob.keyframe_delete(data_path='["licalc"]', frame = frame)
+                if geogennode.geomenu == 'Object':
+                    ob.keyframe_delete(('location', 'rotation_euler', 'scale')[int(geogennode.omanmenu)], frame = frame)
+            except:
+                pass
+            if geogennode.geomenu == 'Mesh' and ob.data.shape_keys and ob.data.shape_keys.key_blocks.get('gen-{}'.format(frame)):
+                vi_func.selobj(scene, ob)
+                for shape in ob.data.shape_keys.key_blocks:
+                    try:
+                        shape.keyframe_delete("value", frame = frame)
+                    except:
+                        pass
+                ob.active_shape_key_index = ob.data.shape_keys.key_blocks.find('gen-{}'.format(frame))
+                bpy.ops.object.shape_key_remove()
+
 def modgeo(ob, geogennode, scene, fc, fs):            
     if geogennode.geomenu == 'Object':
         direc = [(-1, 1)[geogennode.direction == '0'] * xyz for xyz in (geogennode.x, geogennode.y, geogennode.z)]
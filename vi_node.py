@@ -136,6 +136,7 @@ class ViLiNode(bpy.types.Node, ViNodes):
     ehour = bpy.props.FloatProperty(name="", description="Hour of simulation", min=1, max=24, default=12, update = nodeupdate)
     edoy = bpy.props.IntProperty(name="", description="Day of simulation", min=1, max=365, default=1, update = nodeupdate)
     interval = bpy.props.FloatProperty(name="", description="Site Latitude", min=0.25, max=24, default=1, update = nodeupdate)
+    dcmode = bpy.props.BoolProperty(name="", description="Calculate time series from one daylight coefficient pass when only the sky changes", default=False)
     exported = bpy.props.BoolProperty(default=False)
     hdr = bpy.props.BoolProperty(name="", description="Export HDR panoramas", default=False, update = nodeupdate)
     hdrname = bpy.props.StringProperty(name="", description="Name of the HDR image file", default="", update = nodeupdate)
@@ -181,6 +182,7 @@ class ViLiNode(bpy.types.Node, ViNodes):
                     if self.edoy == self.sdoy and self.ehour < self.shour:
                         self.ehour = self.shour
                     newrow(layout, "Interval (hours):", self, 'interval')
+                    newrow(layout, "Daylight coefficients:", self, 'dcmode')
             
             if self.skymenu == '4':
                 row = layout.row()
@@ -253,6 +255,8 @@ class ViLiCBNode(ViLiClass, ViNodes):
     sourcetype2 = [('0', "EPW", "EnergyPlus weather file"), ('2', "HDR", "HDR sky file")]
     sourcemenu = bpy.props.EnumProperty(name="", description="Source type", items=sourcetype, default = '0', update = nodeupdate)
     sourcemenu2 = bpy.props.EnumProperty(name="", description="Source type", items=sourcetype2, default = '0', update = nodeupdate)
+    skysubtype = [('1', "Tregenza", "145 sky patches"), ('2', "Reinhart MF:2", "577 sky patches"), ('4', "Reinhart MF:4", "2305 sky patches")]
+    skysub = bpy.props.EnumProperty(name="", description="Sky subdivision, trading accuracy against calculation time", items=skysubtype, default = '1', update = nodeupdate)
 #    simalg = bpy.props.StringProperty(name="", description="Algorithm to run on the radiance results", default=" |  rcalc  -e '$1=(47.4*$1+120*$2+11.6*$3)/1000' ")
     hdrname = bpy.props.StringProperty(
             name="", description="Name of the composite HDR sky file", default="", update = nodeupdate)
@@ -298,7 +302,7 @@ class ViLiCBNode(ViLiClass, ViNodes):
                newrow(layout, 'Supplementry (Max):', self, 'dasupp')
                newrow(layout, 'Autonomous (Max):', self, 'daauto')
         
-        if self.get('vecvals'):
+        if self.get('vecvals') or self.get('skykey'):
             newrow(layout, 'From node:', self, 'fromnode')
         
         if not self.fromnode:
@@ -310,7 +314,9 @@ class ViLiCBNode(ViLiClass, ViNodes):
                 row.prop(self, 'sourcemenu')
         
             row = layout.row()
-            if self.sm == '1':
+            if self.sm == '0':
+                newrow(layout, 'Sky patches:', self, 'skysub')
+            elif self.sm == '1':
                 row.operator('node.mtxselect', text = 'Select MTX').nodeid = self['nodeid']
                 row = layout.row()
                 row.prop(self, 'mtxname')
@@ -335,7 +341,7 @@ class ViLiCBNode(ViLiClass, ViNodes):
                     export = 1
                 else:
                     export = 0
-            elif self.sm != '0' or self.get('vecvals'):
+            elif self.sm != '0' or self.get('vecvals') or self.get('skykey'):
                 export = 1
             else:
                 export = 0
@@ -425,6 +431,7 @@ class ViLiSNode(bpy.types.Node, ViNodes):
             name="", description="Simulation accuracy", default="1", update = nodeupdate)
     cusacc = bpy.props.StringProperty(
             name="", description="Custom Radiance simulation parameters", default="", update = nodeupdate)
+    ambcache = bpy.props.BoolProperty(name = '', description = "Reuse indirect irradiance between frames and runs with the same scene and ambient parameters", default = True)
     numbasic = (("-ab", 2, 3, 4), ("-ad", 256, 1024, 4096), ("-ar", 128, 512, 1024), ("-as", 128, 512, 1024), ("-aa", 0.3, 0.15, 0.08), ("-dj", 0, 0.7, 1), ("-ds", 0, 0.5, 0.15), ("-dr", 1, 3, 5), ("-ss", 0, 2, 5), ("-st", 1, 0.75, 0.1), ("-lw", 0.05, 0.01, 0.002))
     numadvance = (("-ab", 3, 5), ("-ad", 2048, 4096), ("-ar", 512, 1024), ("-as", 1024, 2048), ("-aa", 0.0, 0.0), ("-dj", 0.7, 1), ("-ds", 0.5, 0.15), ("-dr", 2, 3), ("-ss", 2, 5), ("-st", 0.75, 0.1), ("-lw", 0.001, 0.0002))
         
@@ -455,6 +462,7 @@ class ViLiSNode(bpy.types.Node, ViNodes):
 
             if (self.simacc == '3' and self.inputs['Context in'].links[0].from_node.bl_label == 'LiVi Basic') or (self.csimacc == '0' and self.inputs['Context in'].links[0].from_node.bl_label in ('LiVi Compliance', 'LiVi CBDM')):
                newrow(layout, "Radiance parameters:", self, 'cusacc')
+            newrow(layout, "Ambient cache:", self, 'ambcache')
 
             row = layout.row()
             row.operator("node.radpreview", text = 'Preview').nodeid = self['nodeid']
@@ -750,6 +758,8 @@ class ViEnSimNode(bpy.types.Node, ViNodes):
             row.prop(self, 'resname')
             row = layout.row()
             row.operator("node.ensim", text = 'Calculate').nodeid = self['nodeid']
+            row = layout.row()
+            row.operator("node.enbatch", text = 'Weather sweep').nodeid = self['nodeid']
 
 class ViEnRFNode(bpy.types.Node, ViNodes):
     '''Node for EnergyPlus results file selection'''
@@ -1241,6 +1251,7 @@ class ViGenNode(bpy.types.Node, ViNodes):
     direction = bpy.props.EnumProperty(items=[("0", "Positive", "Increase/positive direction"),("1", "Negative", "Decrease/negative direction")],  name="", description="Manipulation direction", default="0")
     extent = bpy.props.FloatProperty(name = '', min = 0, max = 360, default = 0)
     steps = bpy.props.IntProperty(name = '', min = 1, max = 100, default = 1)
+    candidates = bpy.props.IntProperty(name = '', min = 1, max = 64, default = 1, description = "Number of steps evaluated concurrently")
 
     #    buildstorey = bpy.props.EnumProperty(items=[("0", "Single", "Single storey building"),("1", "Multi", "Multi-storey building")], name="", description="Building storeys", default="0", update = nodeupdate)
 
@@ -1273,6 +1284,7 @@ class ViGenNode(bpy.types.Node, ViNodes):
         newrow(layout, 'Direction:', self, 'direction')
         newrow(layout, 'Extent:', self, 'extent')
         newrow(layout, 'Increment:', self, 'steps')
+        newrow(layout, 'Candidates:', self, 'candidates')
 
 class ViTarNode(bpy.types.Node, ViNodes):
     '''Target Node'''
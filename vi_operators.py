@@ -1,4 +1,4 @@
-import bpy, bpy_extras, sys, datetime, mathutils, os
+import bpy, bpy_extras, sys, datetime, mathutils, os, threading
 import bpy_extras.io_utils as io_utils
 try:
     import numpy
@@ -24,12 +24,14 @@ except:
 from .livi_export import radcexport, radgexport, cyfc1
 from .livi_calc  import rad_prev, li_calc, li_glare, resapply
 from .vi_display import li_display, li_compliance, linumdisplay, spnumdisplay, li3D_legend, viwr_legend
-from .envi_export import enpolymatexport, pregeo
+from .envi_export import enpolymatexport, pregeo, envi_variants
 from .envi_mat import envi_materials, envi_constructions
-from .envi_calc import envi_sim
-from .vi_func import processf, livisimacc, solarPosition, retobjs, wr_axes, clearscene, framerange, vcframe, epwlatilongi, nodeinit
+from .envi_calc import envi_start, envi_stop, envi_lines, envi_errlines, envi_finish, envi_batch
+from .vi_func import processf, livisimacc, solarPosition, solarPositions, retobjs, wr_axes, clearscene, framerange, vcframe, epwlatilongi, nodeinit
 from .vi_chart import chart_disp
 from .vi_gen import vigen
+from .vi_shadow import shadtree, shadfractions
+from . import livi_store
 
 envi_mats = envi_materials()
 envi_cons = envi_constructions()
@@ -437,11 +439,58 @@ class NODE_OT_EnSim(bpy.types.Operator, io_utils.ExportHelper):
     bl_undo = True
     
     nodeid = bpy.props.StringProperty()
+    running = set()
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            if self._esimrun:
+                envi_stop(self._esimrun)
+            self.endrun(context)
+            self.report({'INFO'}, "EnergyPlus simulation cancelled")
+            return {'CANCELLED'}
+        
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        if not self._esimrun:
+            # Queued behind another simulation using the same export directory
+            if self._connode.newdir in NODE_OT_EnSim.running:
+                return {'PASS_THROUGH'}
+            NODE_OT_EnSim.running.add(self._connode.newdir)
+            self._esimrun, self._esimq = envi_start(self._node, self._connode)
+        
+        for line in envi_lines(self._esimq):
+            print(line.strip())
+            if 'Simulation' in line:
+                self.report({'INFO'}, line.strip())
+        errlines, self._errpos = envi_errlines(self._connode, self._errpos)
+        for errline in errlines:
+            print(errline)
+            if 'Severe' in errline or 'Fatal' in errline:
+                self.report({'WARNING'}, errline.strip())
+        
+        if self._esimrun.poll() is None:
+            return {'PASS_THROUGH'}
+        
+        self.endrun(context)
+        envi_finish(self, self._node, self._connode)
+        self.results(context, self._node)
+        return {'FINISHED'}
 
     def invoke(self, context, event):
         node = bpy.data.node_groups[self.nodeid.split('@')[1]].nodes[self.nodeid.split('@')[0]]
         connode = node.inputs['Context in'].links[0].from_node
-        envi_sim(self, node, connode)
+        self._node, self._connode, self._esimrun, self._esimq, self._errpos = node, connode, None, None, 0
+        self._timer = context.window_manager.event_timer_add(1, context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def endrun(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        if self._esimrun:
+            NODE_OT_EnSim.running.discard(self._connode.newdir)
+    
+    def results(self, context, node):
         node.outputs['Results out'].hide = False
         if node.outputs[0].is_linked:
             socket1, socket2  = node.outputs[0], node.outputs[0].links[0].to_socket
@@ -449,8 +498,42 @@ class NODE_OT_EnSim(bpy.types.Operator, io_utils.ExportHelper):
             bpy.data.node_groups[self.nodeid.split('@')[1]].links.new(socket1, socket2)
         scene = context.scene
         scene.vi_display, scene.sp_disp_panel, scene.li_disp_panel, scene.lic_disp_panel, scene.en_disp_panel, scene.ss_disp_panel, scene.wr_disp_panel = 1, 0, 2, 0, 0, 0, 0
+
+class NODE_OT_EnBatch(bpy.types.Operator):
+    bl_idname = "node.enbatch"
+    bl_label = "Weather sweep"
+    bl_description = "Export and run the model with every available weather file in parallel"
+    bl_register = True
+    bl_undo = True
+    
+    nodeid = bpy.props.StringProperty()
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self._batch.is_alive():
+            return {'PASS_THROUGH'}
+        context.window_manager.event_timer_remove(self._timer)
+        self._node['variants'] = self._stores
+        self.report({'INFO'}, "{} of {} weather variants simulated".format(len(self._stores), len(self._vdirs)))
         return {'FINISHED'}
 
+    def invoke(self, context, event):
+        node = bpy.data.node_groups[self.nodeid.split('@')[1]].nodes[self.nodeid.split('@')[0]]
+        connode = node.inputs['Context in'].links[0].from_node
+        locnode = connode.inputs['Location in'].links[0].from_node
+        weather = locnode.weather
+        setup = lambda epw: (lambda: setattr(locnode, 'weather', epw))
+        self._vdirs = envi_variants(self, connode, locnode, envi_mats, envi_cons, [(os.path.splitext(os.path.basename(epw[0]))[0], setup(epw[0])) for epw in locnode.weatherlist])
+        locnode.weather = weather
+        # Simulations and result stores are produced off the interface thread; the modal timer waits on them
+        self._node, self._stores = node, {}
+        self._batch = threading.Thread(target = lambda: self._stores.update(envi_batch(self._vdirs, connode.nproc, node.resname)), daemon = True)
+        self._batch.start()
+        self._timer = context.window_manager.event_timer_add(1, context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
 class NODE_OT_Chart(bpy.types.Operator, io_utils.ExportHelper):
     bl_idname = "node.chart"
     bl_label = "Chart"
@@ -557,12 +640,18 @@ class NODE_OT_SunPath(bpy.types.Operator):
         spathob = context.active_object
         spathob.location, spathob.name,  spathob['VIType'], spathmesh = (0, 0, 0), "SPathMesh", "SPathMesh", spathob.data
 
-        for doy in range(0, 363):
-            if (doy-4)%7 == 0:
-                for hour in range(1, 25):
-                    ([solalt, solazi]) = solarPosition(doy, hour, scene['latitude'], scene['longitude'])[2:]
-                    spathmesh.vertices.add(1)
-                    spathmesh.vertices[-1].co = [-(sd-(sd-(sd*cos(solalt))))*sin(solazi), -(sd-(sd-(sd*cos(solalt))))*cos(solazi), sd*sin(solalt)]
+        if np == 1:
+            spdoys = numpy.repeat([doy for doy in range(0, 363) if (doy-4)%7 == 0], 24)
+            spdirecs = solarPositions(spdoys, numpy.tile(arange(1, 25), len(spdoys)//24), scene['latitude'], scene['longitude'])[4]
+            spathmesh.vertices.add(len(spdirecs))
+            spathmesh.vertices.foreach_set('co', (sd * spdirecs).flatten())
+        else:
+            for doy in range(0, 363):
+                if (doy-4)%7 == 0:
+                    for hour in range(1, 25):
+                        ([solalt, solazi]) = solarPosition(doy, hour, scene['latitude'], scene['longitude'])[2:]
+                        spathmesh.vertices.add(1)
+                        spathmesh.vertices[-1].co = [-(sd-(sd-(sd*cos(solalt))))*sin(solazi), -(sd-(sd-(sd*cos(solalt))))*cos(solazi), sd*sin(solalt)]
 
         for v in range(24, len(spathmesh.vertices)):
             if spathmesh.vertices[v].co.z > 0 or spathmesh.vertices[v - 24].co.z > 0:
@@ -831,7 +920,7 @@ class NODE_OT_Shadow(bpy.types.Operator):
             self.report({'ERROR'},"End hour is before start hour.")
             return{'FINISHED'}
         scene.resnode = simnode.name
-        direcs, obcalclist = [], []
+        direcs, obcalclist, shadtrees = [], [], {}
         simnode['Animation'] = simnode.animmenu
         if simnode['Animation'] == 'Static':
             scmaxres, scminres, scavres, scene.fs = [0], [100], [0], scene.frame_current
@@ -846,12 +935,22 @@ class NODE_OT_Shadow(bpy.types.Operator):
         y =  datetime.datetime.now().year if locnode.endmonth >= locnode.startmonth else datetime.datetime.now().year + 1
         endtime = datetime.datetime(y, locnode.endmonth, (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)[locnode.endmonth - 1], simnode.endhour - 1)
         interval = datetime.timedelta(hours = modf(simnode.interval)[0], minutes = 60 * modf(simnode.interval)[1])
-        while time <= endtime:
-            if simnode.starthour <= time.hour <= simnode.endhour:
-                beta, phi = solarPosition(time.timetuple().tm_yday, time.hour+time.minute/60, scene['latitude'], scene['longitude'])[2:]
-                if beta > 0:
-                    direcs.append(mathutils.Vector((-sin(phi), -cos(phi), tan(beta))))
-            time += interval
+        if np == 1:
+            stimes = []
+            while time <= endtime:
+                if simnode.starthour <= time.hour <= simnode.endhour:
+                    stimes.append((time.timetuple().tm_yday, time.hour+time.minute/60))
+                time += interval
+            if stimes:
+                betas, phis = solarPositions([st[0] for st in stimes], [st[1] for st in stimes], scene['latitude'], scene['longitude'])[2:4]
+                direcs = [mathutils.Vector((-sin(phi), -cos(phi), tan(beta))) for beta, phi in zip(betas, phis) if beta > 0]
+        else:
+            while time <= endtime:
+                if simnode.starthour <= time.hour <= simnode.endhour:
+                    beta, phi = solarPosition(time.timetuple().tm_yday, time.hour+time.minute/60, scene['latitude'], scene['longitude'])[2:]
+                    if beta > 0:
+                        direcs.append(mathutils.Vector((-sin(phi), -cos(phi), tan(beta))))
+                time += interval
 
         for ob in [ob for ob in scene.objects if ob.type == 'MESH' and not ob.hide]:
             obavres, shadfaces, shadcentres = [0] * (fdiff), [[] for f in range(fdiff)], [[] for f in range(fdiff)]
@@ -870,13 +969,15 @@ class NODE_OT_Shadow(bpy.types.Operator):
                     vertexColor = ob.data.vertex_colors[-1]
                     obsumarea[findex] = sum([face.area for face in ob.data.polygons if ob.data.materials[face.material_index].vi_shadow])
                     shadfaces = [face for face in ob.data.polygons if ob.data.materials[face.material_index].vi_shadow]
-                    shadcentres[findex] = [[obm*mathutils.Vector((face.center)) + 0.05*face.normal, obm*mathutils.Vector((face.center)), 1] for face in shadfaces]
+                    shadnormals = [(obm.to_3x3()*face.normal).normalized() for face in shadfaces]
+                    shadcentres[findex] = [[obm*mathutils.Vector((face.center)) + 0.05*shadnormals[fa], obm*mathutils.Vector((face.center)), 1] for fa, face in enumerate(shadfaces)]
+                    if frame not in shadtrees:
+                        shadtrees[frame] = shadtree(scene)
+                    shadfracs = shadfractions(scene, shadtrees[frame], [sc[0] for sc in shadcentres[findex]], shadnormals, direcs)
                     for fa, face in enumerate(shadfaces):
                         for li in face.loop_indices:
                             vertexColor.data[li].color = (1, 1, 1)
-                        for direc in direcs:
-                            if bpy.data.scenes[0].ray_cast(shadcentres[findex][fa][0], shadcentres[findex][fa][1] + 10000*direc)[0]:
-                                shadcentres[findex][fa][2] -= 1/(len(direcs))
+                        shadcentres[findex][fa][2] = shadfracs[fa]
                         if shadcentres[findex][fa][2] < 1:
                             for li in face.loop_indices:
                                 vertexColor.data[li].color = [shadcentres[findex][fa][2]]*3
@@ -892,7 +993,9 @@ class NODE_OT_Shadow(bpy.types.Operator):
                 ob['omax'] = {str(f):obmaxres[f - scene.fs] for f in framerange(scene, simnode.animmenu)}
                 ob['omin'] = {str(f):obminres[f - scene.fs] for f in framerange(scene, simnode.animmenu)}
                 ob['oave'] = {str(f):obavres[f - scene.fs] for f in framerange(scene, simnode.animmenu)}
-                ob['oreslist'] = {str(f):[100*sh[2] for sh in shadcentres[f - scene.fs]] for f in framerange(scene, simnode.animmenu)}
+                livi_store.clear(ob, 'oreslist')
+                for f in framerange(scene, simnode.animmenu):
+                    livi_store.write(None, ob, 'oreslist', f, [100*sh[2] for sh in shadcentres[f - scene.fs]])
             
             else:
                ob.licalc = 0
@@ -0,0 +1,45 @@
+import bpy
+
+try:
+    from mathutils.bvhtree import BVHTree
+    bvh = 1
+except:
+    bvh = 0
+
+try:
+    import numpy
+    np = 1
+except:
+    np = 0
+
+def shadtree(scene):
+    # One BVH tree of the evaluated, world space scene geometry for the current frame
+    if not bvh:
+        return(None)
+    verts, polys = [], []
+    for ob in [ob for ob in scene.objects if ob.type == 'MESH' and not ob.hide]:
+        mesh = ob.to_mesh(scene, True, 'PREVIEW', calc_tessface=False)
+        mesh.transform(ob.matrix_world)
+        polys += [[v + len(verts) for v in poly.vertices] for poly in mesh.polygons]
+        verts += [vert.co.copy() for vert in mesh.vertices]
+        bpy.data.meshes.remove(mesh)
+    return(BVHTree.FromPolygons(verts, polys))
+
+def shadfractions(scene, tree, starts, normals, direcs, dist = 10000):
+    # Fraction of sun directions that reach each start point. Directions behind the face are
+    # culled before any rays are cast and count as shaded.
+    if not direcs:
+        return([1] * len(starts))
+    udirecs = [direc.normalized() for direc in direcs]
+    if np == 1:
+        facing = numpy.dot(numpy.array([normal[:] for normal in normals]), numpy.array([udirec[:] for udirec in udirecs]).T) > 0
+    else:
+        facing = [[normal.dot(udirec) > 0 for udirec in udirecs] for normal in normals]
+    fracs = []
+    for s, start in enumerate(starts):
+        if tree:
+            lit = [1 for d, udirec in enumerate(udirecs) if facing[s][d] and tree.ray_cast(start, udirec, dist * direcs[d].length)[0] is None]
+        else:
+            lit = [1 for d, direc in enumerate(direcs) if facing[s][d] and not scene.ray_cast(start, start + dist * direc)[0]]
+        fracs.append(len(lit)/len(direcs))
+    return(fracs)